@@ -0,0 +1,577 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compute backends for the per-pixel kernels.
+#   'reference': the original per-pixel python loops
+#   'numpy':     whole-frame vectorized numpy (default)
+#   'numba':     JIT-compiled multi-core loops, only if numba is installed
+# The backend is picked by the 'backend' argument of the callers, or by the
+# UNROLLING_BACKEND environment variable.
+
+from __future__ import absolute_import, division, print_function
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from numpy import linalg as LA
+
+try:
+    import numba
+    from numba import prange
+except ImportError:
+    numba = None
+
+DEFAULT_BACKEND = 'numpy'
+# threads running the frames of a batch, e.g. UNROLLING_THREADS=1 to disable
+NUM_THREADS = int(os.environ.get('UNROLLING_THREADS', os.cpu_count() or 1))
+
+_kernels = {}
+# thread pool per process, a forked worker starts its own
+_pools = {}
+
+
+def register(kernel, backend):
+    def decorator(fn):
+        _kernels.setdefault(kernel, {})[backend] = fn
+        return fn
+    return decorator
+
+
+def getBackends(kernel):
+    return sorted(_kernels[kernel].keys())
+
+
+def getKernel(kernel, backend=None):
+    if backend is None:
+        backend = os.environ.get('UNROLLING_BACKEND', DEFAULT_BACKEND)
+    if backend not in _kernels[kernel]:
+        raise ValueError('Backend {} is not available for {}, choose from {}'.format(
+            backend, kernel, getBackends(kernel)))
+    return _kernels[kernel][backend]
+
+
+def setNumThreads(num_threads):
+    # threads of mapFrames and the numba kernels in this process, e.g. 1 in
+    # workers of a process pool that already covers the cores
+    global NUM_THREADS
+    NUM_THREADS = num_threads
+    if numba is not None:
+        numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def mapFrames(fn, batch):
+    # fn(b) for every frame of a batch, on threads if there are cores (the
+    # whole-frame numpy ops release the GIL)
+    if NUM_THREADS <= 1 or batch <= 1:
+        return [fn(b) for b in range(batch)]
+    pid = os.getpid()
+    if pid not in _pools:
+        _pools[pid] = ThreadPoolExecutor(NUM_THREADS)
+    return list(_pools[pid].map(fn, range(batch)))
+
+
+def scatterFlow(flows, src, u_gs, v_gs):
+    # splat flows of rs pixels (flat indices src into (B, h, w), raster
+    # order) onto their rounded gs pixels; the last rs pixel wins
+    batch, h, w = flows.shape[:3]
+    valid = np.isfinite(u_gs) & np.isfinite(v_gs)
+    src, u_gs, v_gs = src[valid], u_gs[valid], v_gs[valid]
+    # round like int(x+0.5), i.e. towards zero
+    u_gsi, v_gsi = np.trunc(u_gs+0.5), np.trunc(v_gs+0.5)
+    inside = (0 <= u_gsi) & (u_gsi < w) & (0 <= v_gsi) & (v_gsi < h)
+    src, u_gs, v_gs = src[inside], u_gs[inside], v_gs[inside]
+    dst = (src // (h*w) * h + v_gsi[inside].astype(np.intp)) * \
+        w + u_gsi[inside].astype(np.intp)
+
+    # dst is almost sorted already, which suits a stable merge sort
+    order = np.argsort(dst, kind='stable')
+    dst_sorted = dst[order]
+    keep = order[np.append(dst_sorted[1:] != dst_sorted[:-1], True)]
+
+    flows_flat = flows.reshape(-1, 2)
+    flows_flat[dst[keep], 0] = src[keep] % w - u_gs[keep]
+    flows_flat[dst[keep], 1] = src[keep] // w % h - v_gs[keep]
+    return flows
+
+
+def projectPoint(ua, va, da, cam_a, T_b_a, cam_b):
+    Xa = np.ones([3, 1], dtype=np.float32)
+    Xa[0] = (ua-cam_a[2]) / cam_a[0]
+    Xa[1] = (va-cam_a[3]) / cam_a[1]
+    Xa = Xa*da
+    Xb = np.matmul(T_b_a[0:3, 0:3], Xa)+np.expand_dims(T_b_a[0:3, 3], -1)
+    ub = Xb[0, 0]/Xb[2, 0]*cam_b[0] + cam_b[2]
+    vb = Xb[1, 0]/Xb[2, 0]*cam_b[1] + cam_b[3]
+    return [ub, vb]
+
+
+def getRay(cam, uv):
+    ray_uv = np.ones(3, dtype=np.float32)
+    ray_uv[0] = (uv[0]-cam[2]) / cam[0]
+    ray_uv[1] = (uv[1]-cam[3]) / cam[1]
+    return np.expand_dims(ray_uv / LA.norm(ray_uv), -1)
+
+
+def depthFromTriangulation(cam_ref, cam_cur, T_cur_ref, uv_ref, uv_cur):
+    R_cur_ref = T_cur_ref[0:3, 0:3]
+    t_cur_ref = T_cur_ref[0:3, 3]
+    ray_uv_ref = getRay(cam_ref, uv_ref)
+    ray_uv_cur = getRay(cam_cur, uv_cur)
+
+    A = np.hstack((np.matmul(R_cur_ref, ray_uv_ref), ray_uv_cur))
+    AtA = np.matmul(A.T, A)
+    if LA.det(AtA) < 1e-5:
+        return -1
+    depth2 = - np.matmul(np.matmul(LA.inv(AtA), A.T), t_cur_ref)
+    depth = np.fabs(depth2[0])
+
+    return depth*ray_uv_ref[-1, 0]
+
+
+def getRays(cam, u, v):
+    rays = np.ones([u.shape[0], 3], dtype=np.float32)
+    rays[:, 0] = (u-cam[2]) / cam[0]
+    rays[:, 1] = (v-cam[3]) / cam[1]
+    return rays / LA.norm(rays, axis=-1, keepdims=True)
+
+
+# splat_flow: (B, h, w) depths and per-row poses (B, h, 3, 3) K*R*K_i and
+# (B, h, 3) K*t to (B, h, w, 2) gs-to-rs flows
+
+@register('splat_flow', 'reference')
+def splatFlowLoop(depths_rs, KRK_i, Kt):
+    batch, h, w = depths_rs.shape[:3]
+    depths_rs = np.reshape(depths_rs, (batch, h, w))
+    flows_gs2rs = np.empty([batch, h, w, 2], dtype=np.float32)
+    flows_gs2rs[:] = np.nan
+
+    # Project from rs to gs
+    for b in range(batch):
+        for v_rs in range(h):
+            for u_rs in range(w):
+                if np.isnan(depths_rs[b, v_rs, u_rs]):
+                    continue
+
+                p_gs = depths_rs[b, v_rs, u_rs] * \
+                    np.matmul(KRK_i[b, v_rs], np.array(
+                        [u_rs, v_rs, 1])) + Kt[b, v_rs]
+                u_gs, v_gs = p_gs[0] / p_gs[2], p_gs[1] / p_gs[2]
+                if not np.isnan(u_gs):
+                    u_gsi, v_gsi = int(u_gs+0.5), int(v_gs+0.5)
+                    if 0 <= u_gsi < w and 0 <= v_gsi < h:
+                        flows_gs2rs[b, v_gsi, u_gsi, 0] = u_rs-u_gs
+                        flows_gs2rs[b, v_gsi, u_gsi, 1] = v_rs-v_gs
+
+    return flows_gs2rs
+
+
+def projectRows(depths_rs, KRK_i, Kt):
+    # gs projections (B, h, w) of all rs pixels, sharing the per-row terms
+    batch, h, w = depths_rs.shape[:3]
+    depths_rs = np.reshape(depths_rs, (batch, h, w)).astype(np.float64)
+    u = np.arange(w, dtype=np.float64)
+    v = np.arange(h, dtype=np.float64)[None, :, None, None]
+    KRK_i_u = KRK_i[:, :, :, 0, None]
+    KRK_i_v = v*KRK_i[:, :, :, 1, None]
+    KRK_i_1 = KRK_i[:, :, :, 2, None]
+    p_gs = depths_rs[:, :, None, :] * \
+        (u*KRK_i_u + KRK_i_v + KRK_i_1) + Kt[:, :, :, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u_gs = p_gs[:, :, 0] / p_gs[:, :, 2]
+        v_gs = p_gs[:, :, 1] / p_gs[:, :, 2]
+    return u_gs, v_gs
+
+
+@register('splat_flow', 'numpy')
+def splatFlowNumpy(depths_rs, KRK_i, Kt):
+    batch, h, w = depths_rs.shape[:3]
+    flows_gs2rs = np.empty([batch, h, w, 2], dtype=np.float32)
+    flows_gs2rs[:] = np.nan
+    src = np.arange(h*w)
+
+    # frame by frame, which keeps the temporaries of a frame in cache; nan
+    # depth gives nan projections, which scatterFlow drops
+    def splat(b):
+        u_gs, v_gs = projectRows(depths_rs[b:b+1], KRK_i[b:b+1], Kt[b:b+1])
+        scatterFlow(flows_gs2rs[b:b+1], src, u_gs.ravel(), v_gs.ravel())
+    mapFrames(splat, batch)
+    return flows_gs2rs
+
+
+# splat_points: (n,) raster-ordered flat pixel indices with their (n, 3)
+# back-projected points, per-row poses (h, 3, 3) K*R and (h, 3) K*t and the
+# image shape (h, w) to (h, w, 2) gs-to-rs flow
+
+@register('splat_points', 'reference')
+def splatPointsLoop(pixels, points, KR, Kt, shape):
+    h, w = shape
+    flow_gs2rs = np.empty([h, w, 2], dtype=np.float32)
+    flow_gs2rs[:] = np.nan
+
+    for i in range(pixels.shape[0]):
+        v_rs, u_rs = pixels[i] // w, pixels[i] % w
+        p_gs = np.matmul(KR[v_rs], points[i].astype(np.float64)) + Kt[v_rs]
+        u_gs, v_gs = p_gs[0] / p_gs[2], p_gs[1] / p_gs[2]
+        if not np.isnan(u_gs):
+            u_gsi, v_gsi = int(u_gs+0.5), int(v_gs+0.5)
+            if 0 <= u_gsi < w and 0 <= v_gsi < h:
+                flow_gs2rs[v_gsi, u_gsi, 0] = u_rs-u_gs
+                flow_gs2rs[v_gsi, u_gsi, 1] = v_rs-v_gs
+
+    return flow_gs2rs
+
+
+@register('splat_points', 'numpy')
+def splatPointsNumpy(pixels, points, KR, Kt, shape):
+    h, w = shape
+    flow_gs2rs = np.empty([1, h, w, 2], dtype=np.float32)
+    flow_gs2rs[:] = np.nan
+
+    pixels = pixels.astype(np.intp)
+    v_rs = pixels // w
+    p_gs = np.einsum('nij,nj->ni', KR[v_rs],
+                     points.astype(np.float64)) + Kt[v_rs]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u_gs, v_gs = p_gs[:, 0] / p_gs[:, 2], p_gs[:, 1] / p_gs[:, 2]
+    return scatterFlow(flow_gs2rs, pixels, u_gs, v_gs)[0]
+
+
+# gt_flow: (h, w) depth, camera, (h, 4, 4) gs-from-rs pose per scan time and
+# (h, w) scan time lookup table to (h, w, 2) gs-to-rs flow
+
+@register('gt_flow', 'reference')
+def gtFlowLoop(depth_rs, cam1, T_gs_rs, v1_lut):
+    h, w = depth_rs.shape[:2]
+    flow_gs2rs = np.empty([h, w, 2], dtype=np.float32)
+    flow_gs2rs[:] = np.nan
+
+    # Project from rs to gs
+    for v1rs in range(h):
+        for u1rs in range(w):
+            if np.isnan(depth_rs[v1rs, u1rs]):
+                continue
+
+            [u1gs, v1gs] = projectPoint(
+                u1rs, v1rs, depth_rs[v1rs, u1rs], cam1, T_gs_rs[v1_lut[v1rs, u1rs]], cam1)
+            if not np.isnan(u1gs):
+                u1gsi, v1gsi = int(u1gs+0.5), int(v1gs+0.5)
+                if 0 <= u1gsi < w and 0 <= v1gsi < h:
+                    flow_gs2rs[v1gsi, u1gsi, 0] = u1rs-u1gs
+                    flow_gs2rs[v1gsi, u1gsi, 1] = v1rs-v1gs
+
+    return flow_gs2rs
+
+
+@register('gt_flow', 'numpy')
+def gtFlowNumpy(depth_rs, cam1, T_gs_rs, v1_lut):
+    h, w = depth_rs.shape[:2]
+    depth_rs = np.reshape(depth_rs, (h, w))
+    flow_gs2rs = np.empty([1, h, w, 2], dtype=np.float32)
+    flow_gs2rs[:] = np.nan
+
+    src = np.flatnonzero(~np.isnan(depth_rs))
+    v1rs, u1rs = src // w, src % w
+    Xa = np.ones([src.shape[0], 3], dtype=np.float32)
+    Xa[:, 0] = (u1rs-cam1[2]) / cam1[0]
+    Xa[:, 1] = (v1rs-cam1[3]) / cam1[1]
+    Xa = Xa * depth_rs.ravel()[src, None]
+    T = T_gs_rs[v1_lut.ravel()[src]]
+    Xb = np.einsum('nij,nj->ni', T[:, 0:3, 0:3], Xa) + T[:, 0:3, 3]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u1gs = Xb[:, 0]/Xb[:, 2]*cam1[0] + cam1[2]
+        v1gs = Xb[:, 1]/Xb[:, 2]*cam1[1] + cam1[3]
+    return scatterFlow(flow_gs2rs, src, u1gs, v1gs)[0]
+
+
+# flow_bd: forward flow01, backward flow10 and squared pixel threshold to
+# flow01 with the pixels failing the bi-directional check set to nan
+
+@register('flow_bd', 'reference')
+def flowBDLoop(flow01, flow10, thres):
+    h, w = flow01.shape[:2]
+    flow01_filtered = np.empty_like(flow01)
+    flow01_filtered[:] = np.nan
+    for v0 in range(h):
+        for u0 in range(w):
+            fu01, fv01 = flow01[v0, u0, :]
+            u1, v1 = u0+fu01, v0+fv01
+            u1i, v1i = int(u1+0.5), int(v1+0.5)
+            if 0 <= v1i < h and 0 <= u1i < w:
+                fu10, fv10 = flow10[v1i, u1i, :]
+                du, dv = u1+fu10-u0, v1+fv10-v0
+                if (du*du+dv*dv) < thres:  # bi-directional filtering
+                    flow01_filtered[v0, u0, 0] = flow01[v0, u0, 0]
+                    flow01_filtered[v0, u0, 1] = flow01[v0, u0, 1]
+    return flow01_filtered
+
+
+@register('flow_bd', 'numpy')
+def flowBDNumpy(flow01, flow10, thres):
+    h, w = flow01.shape[:2]
+    v0, u0 = np.indices((h, w))
+    u1, v1 = u0+flow01[:, :, 0], v0+flow01[:, :, 1]
+    u1i, v1i = np.trunc(u1+0.5), np.trunc(v1+0.5)
+    inside = (0 <= v1i) & (v1i < h) & (0 <= u1i) & (u1i < w)
+    u1i = np.where(inside, u1i, 0).astype(np.intp)
+    v1i = np.where(inside, v1i, 0).astype(np.intp)
+    du = u1+flow10[v1i, u1i, 0]-u0
+    dv = v1+flow10[v1i, u1i, 1]-v0
+    keep = inside & ((du*du+dv*dv) < thres)
+
+    flow01_filtered = np.empty_like(flow01)
+    flow01_filtered[:] = np.nan
+    flow01_filtered[keep] = flow01[keep]
+    return flow01_filtered
+
+
+# triangulate: filtered flow10, cameras, (h, 4, 4) cam0-from-cam1 pose per
+# scan time and (h, w) scan time lookup table to (h, w) cam1 depth
+
+@register('triangulate', 'reference')
+def triangulateLoop(flow10, cam0, cam1, T_cam0_v1, v1_lut):
+    h, w = flow10.shape[:2]
+    depth1 = np.empty([h, w])
+    depth1[:] = np.nan
+
+    for v1 in range(h):
+        for u1 in range(w):
+            fu, fv = flow10[v1, u1, :]
+            if not np.isnan(fu):
+                uv0 = [u1+fu, v1+fv]
+                depth1[v1, u1] = depthFromTriangulation(
+                    cam1, cam0, T_cam0_v1[v1_lut[v1, u1]], [u1, v1], uv0)
+
+    return depth1
+
+
+@register('triangulate', 'numpy')
+def triangulateNumpy(flow10, cam0, cam1, T_cam0_v1, v1_lut):
+    h, w = flow10.shape[:2]
+    depth1 = np.empty([h, w])
+    depth1[:] = np.nan
+
+    v1, u1 = np.nonzero(~np.isnan(flow10[:, :, 0]))
+    ray_uv_ref = getRays(cam1, u1, v1)
+    ray_uv_cur = getRays(cam0, u1+flow10[v1, u1, 0], v1+flow10[v1, u1, 1])
+    T_cur_ref = T_cam0_v1[v1_lut[v1, u1]]
+
+    # 2x2 normal equations of [R*ray_ref, ray_cur] * depths = -t
+    a0 = np.einsum('nij,nj->ni', T_cur_ref[:, 0:3, 0:3], ray_uv_ref)
+    a1 = ray_uv_cur
+    t = T_cur_ref[:, 0:3, 3]
+    m00, m01, m11 = np.sum(a0*a0, -1), np.sum(a0*a1, -1), np.sum(a1*a1, -1)
+    det = m00*m11 - m01*m01
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth2 = -(m11*np.sum(a0*t, -1) - m01*np.sum(a1*t, -1)) / det
+    depth = np.fabs(depth2)*ray_uv_ref[:, 2]
+    depth1[v1, u1] = np.where(det < 1e-5, -1, depth)
+    return depth1
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _splatFlowNumba(depths_rs, KRK_i, Kt):
+        batch, h, w = depths_rs.shape
+        dst = np.full((batch, h, w), -1, dtype=np.int64)
+        flows_rs = np.empty((batch, h, w, 2), dtype=np.float64)
+
+        # project every row in parallel
+        for bv in prange(batch*h):
+            b, v_rs = bv // h, bv % h
+            M = KRK_i[b, v_rs]
+            for u_rs in range(w):
+                d = depths_rs[b, v_rs, u_rs]
+                if np.isnan(d):
+                    continue
+                p0 = d*(u_rs*M[0, 0] + v_rs*M[0, 1] + M[0, 2]) + Kt[b, v_rs, 0]
+                p1 = d*(u_rs*M[1, 0] + v_rs*M[1, 1] + M[1, 2]) + Kt[b, v_rs, 1]
+                p2 = d*(u_rs*M[2, 0] + v_rs*M[2, 1] + M[2, 2]) + Kt[b, v_rs, 2]
+                u_gs, v_gs = p0 / p2, p1 / p2
+                if not (np.isfinite(u_gs) and np.isfinite(v_gs)):
+                    continue
+                u_gsi, v_gsi = np.trunc(u_gs+0.5), np.trunc(v_gs+0.5)
+                if 0 <= u_gsi < w and 0 <= v_gsi < h:
+                    dst[b, v_rs, u_rs] = int(v_gsi)*w + int(u_gsi)
+                    flows_rs[b, v_rs, u_rs, 0] = u_rs-u_gs
+                    flows_rs[b, v_rs, u_rs, 1] = v_rs-v_gs
+
+        # splat each frame in raster order, so the last rs pixel wins
+        flows_gs2rs = np.full((batch, h, w, 2), np.nan, dtype=np.float32)
+        for b in prange(batch):
+            for v_rs in range(h):
+                for u_rs in range(w):
+                    i = dst[b, v_rs, u_rs]
+                    if i >= 0:
+                        flows_gs2rs[b, i // w, i % w, 0] = flows_rs[b, v_rs, u_rs, 0]
+                        flows_gs2rs[b, i // w, i % w, 1] = flows_rs[b, v_rs, u_rs, 1]
+        return flows_gs2rs
+
+    @register('splat_flow', 'numba')
+    def splatFlowNumba(depths_rs, KRK_i, Kt):
+        batch, h, w = depths_rs.shape[:3]
+        depths_rs = np.reshape(depths_rs, (batch, h, w)).astype(np.float64)
+        return _splatFlowNumba(depths_rs, np.ascontiguousarray(KRK_i, dtype=np.float64),
+                               np.ascontiguousarray(Kt, dtype=np.float64))
+
+    @numba.njit(parallel=True, cache=True)
+    def _splatPointsNumba(pixels, points, KR, Kt, h, w):
+        n = pixels.shape[0]
+        dst = np.full(n, -1, dtype=np.int64)
+        flows_rs = np.empty((n, 2), dtype=np.float64)
+
+        for i in prange(n):
+            v_rs, u_rs = pixels[i] // w, pixels[i] % w
+            M = KR[v_rs]
+            x, y, z = points[i, 0], points[i, 1], points[i, 2]
+            p0 = M[0, 0]*x + M[0, 1]*y + M[0, 2]*z + Kt[v_rs, 0]
+            p1 = M[1, 0]*x + M[1, 1]*y + M[1, 2]*z + Kt[v_rs, 1]
+            p2 = M[2, 0]*x + M[2, 1]*y + M[2, 2]*z + Kt[v_rs, 2]
+            u_gs, v_gs = p0 / p2, p1 / p2
+            if not (np.isfinite(u_gs) and np.isfinite(v_gs)):
+                continue
+            u_gsi, v_gsi = np.trunc(u_gs+0.5), np.trunc(v_gs+0.5)
+            if 0 <= u_gsi < w and 0 <= v_gsi < h:
+                dst[i] = int(v_gsi)*w + int(u_gsi)
+                flows_rs[i, 0] = u_rs-u_gs
+                flows_rs[i, 1] = v_rs-v_gs
+
+        # splat in raster order, so the last rs pixel wins
+        flow_gs2rs = np.full((h, w, 2), np.nan, dtype=np.float32)
+        for i in range(n):
+            if dst[i] >= 0:
+                flow_gs2rs[dst[i] // w, dst[i] % w, 0] = flows_rs[i, 0]
+                flow_gs2rs[dst[i] // w, dst[i] % w, 1] = flows_rs[i, 1]
+        return flow_gs2rs
+
+    @register('splat_points', 'numba')
+    def splatPointsNumba(pixels, points, KR, Kt, shape):
+        return _splatPointsNumba(pixels.astype(np.int64),
+                                 points.astype(np.float64),
+                                 np.ascontiguousarray(KR, dtype=np.float64),
+                                 np.ascontiguousarray(Kt, dtype=np.float64),
+                                 int(shape[0]), int(shape[1]))
+
+    @numba.njit(parallel=True, cache=True)
+    def _gtFlowNumba(depth_rs, cam1, T_gs_rs, v1_lut):
+        h, w = depth_rs.shape
+        dst = np.full((h, w), -1, dtype=np.int64)
+        flows_rs = np.empty((h, w, 2), dtype=np.float64)
+
+        for v1rs in prange(h):
+            for u1rs in range(w):
+                d = depth_rs[v1rs, u1rs]
+                if np.isnan(d):
+                    continue
+                T = T_gs_rs[v1_lut[v1rs, u1rs]]
+                x = np.float32((u1rs-cam1[2]) / cam1[0]) * d
+                y = np.float32((v1rs-cam1[3]) / cam1[1]) * d
+                z = d
+                xb = T[0, 0]*x + T[0, 1]*y + T[0, 2]*z + T[0, 3]
+                yb = T[1, 0]*x + T[1, 1]*y + T[1, 2]*z + T[1, 3]
+                zb = T[2, 0]*x + T[2, 1]*y + T[2, 2]*z + T[2, 3]
+                u1gs = xb/zb*cam1[0] + cam1[2]
+                v1gs = yb/zb*cam1[1] + cam1[3]
+                if not (np.isfinite(u1gs) and np.isfinite(v1gs)):
+                    continue
+                u1gsi, v1gsi = np.trunc(u1gs+0.5), np.trunc(v1gs+0.5)
+                if 0 <= u1gsi < w and 0 <= v1gsi < h:
+                    dst[v1rs, u1rs] = int(v1gsi)*w + int(u1gsi)
+                    flows_rs[v1rs, u1rs, 0] = u1rs-u1gs
+                    flows_rs[v1rs, u1rs, 1] = v1rs-v1gs
+
+        flow_gs2rs = np.full((h, w, 2), np.nan, dtype=np.float32)
+        for v1rs in range(h):
+            for u1rs in range(w):
+                i = dst[v1rs, u1rs]
+                if i >= 0:
+                    flow_gs2rs[i // w, i % w, 0] = flows_rs[v1rs, u1rs, 0]
+                    flow_gs2rs[i // w, i % w, 1] = flows_rs[v1rs, u1rs, 1]
+        return flow_gs2rs
+
+    @register('gt_flow', 'numba')
+    def gtFlowNumba(depth_rs, cam1, T_gs_rs, v1_lut):
+        h, w = depth_rs.shape[:2]
+        return _gtFlowNumba(np.reshape(depth_rs, (h, w)).astype(np.float64),
+                            np.asarray(cam1, dtype=np.float64),
+                            np.ascontiguousarray(T_gs_rs, dtype=np.float64),
+                            np.ascontiguousarray(v1_lut, dtype=np.int64))
+
+    @numba.njit(parallel=True, cache=True)
+    def _flowBDNumba(flow01, flow10, thres):
+        h, w = flow01.shape[:2]
+        flow01_filtered = np.full(flow01.shape, np.nan, dtype=flow01.dtype)
+        for v0 in prange(h):
+            for u0 in range(w):
+                u1, v1 = u0+flow01[v0, u0, 0], v0+flow01[v0, u0, 1]
+                u1i, v1i = np.trunc(u1+0.5), np.trunc(v1+0.5)
+                if 0 <= v1i < h and 0 <= u1i < w:
+                    du = u1+flow10[int(v1i), int(u1i), 0]-u0
+                    dv = v1+flow10[int(v1i), int(u1i), 1]-v0
+                    if (du*du+dv*dv) < thres:
+                        flow01_filtered[v0, u0, 0] = flow01[v0, u0, 0]
+                        flow01_filtered[v0, u0, 1] = flow01[v0, u0, 1]
+        return flow01_filtered
+
+    @register('flow_bd', 'numba')
+    def flowBDNumba(flow01, flow10, thres):
+        return _flowBDNumba(np.ascontiguousarray(flow01),
+                            np.ascontiguousarray(flow10), thres)
+
+    @numba.njit(parallel=True, cache=True)
+    def _triangulateNumba(flow10, cam0, cam1, T_cam0_v1, v1_lut):
+        h, w = flow10.shape[:2]
+        depth1 = np.full((h, w), np.nan)
+        for v1 in prange(h):
+            ray_ref = np.empty(3, dtype=np.float32)
+            ray_cur = np.empty(3, dtype=np.float32)
+            for u1 in range(w):
+                fu, fv = flow10[v1, u1, 0], flow10[v1, u1, 1]
+                if np.isnan(fu):
+                    continue
+                ray_ref[0] = (u1-cam1[2]) / cam1[0]
+                ray_ref[1] = (v1-cam1[3]) / cam1[1]
+                ray_ref[2] = 1
+                ray_ref /= np.sqrt(np.sum(ray_ref*ray_ref))
+                ray_cur[0] = (u1+fu-cam0[2]) / cam0[0]
+                ray_cur[1] = (v1+fv-cam0[3]) / cam0[1]
+                ray_cur[2] = 1
+                ray_cur /= np.sqrt(np.sum(ray_cur*ray_cur))
+
+                T = T_cam0_v1[v1_lut[v1, u1]]
+                m00, m01, m11, b0, b1 = 0.0, 0.0, 0.0, 0.0, 0.0
+                for i in range(3):
+                    a0 = T[i, 0]*ray_ref[0] + T[i, 1] * \
+                        ray_ref[1] + T[i, 2]*ray_ref[2]
+                    m00 += a0*a0
+                    m01 += a0*ray_cur[i]
+                    m11 += ray_cur[i]*ray_cur[i]
+                    b0 += a0*T[i, 3]
+                    b1 += ray_cur[i]*T[i, 3]
+                det = m00*m11 - m01*m01
+                if det < 1e-5:
+                    depth1[v1, u1] = -1
+                else:
+                    depth2 = -(m11*b0 - m01*b1) / det
+                    depth1[v1, u1] = np.fabs(depth2)*ray_ref[2]
+        return depth1
+
+    @register('triangulate', 'numba')
+    def triangulateNumba(flow10, cam0, cam1, T_cam0_v1, v1_lut):
+        return _triangulateNumba(np.ascontiguousarray(flow10),
+                                 np.asarray(cam0, dtype=np.float64),
+                                 np.asarray(cam1, dtype=np.float64),
+                                 np.ascontiguousarray(
+                                     T_cam0_v1, dtype=np.float64),
+                                 np.ascontiguousarray(v1_lut, dtype=np.int64))
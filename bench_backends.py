@@ -0,0 +1,115 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Check every backend of every kernel against the reference one and time it
+
+from __future__ import print_function, division
+import argparse
+import sys
+import time
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from backends import getBackends, getKernel
+from rectifier import rectifier
+
+# read benchmark settings from command line
+parser = argparse.ArgumentParser()
+parser.add_argument('--repeat', help='Timed runs per backend', default=3)
+parser.add_argument(
+    '--tol', help='Largest value difference to the reference backend', default=1e-3)
+args = parser.parse_args()
+repeat = int(args.repeat)
+tol = float(args.tol)
+
+# synthetic inputs at the processed resolution, roughly like the TUM data
+h, w = 256, 320
+cam0 = np.array([160.0, 160.0, 160.0, 128.0, 0.0])
+cam1 = np.array([160.0, 160.0, 160.0, 128.0, -0.1])
+rng = np.random.RandomState(0)
+
+
+def randomDepth():
+    depth = 1.0 + 4.0*rng.rand(1, 1) + 0.1*rng.rand(h, w)
+    depth[rng.rand(h, w) < 0.3] = np.nan
+    return depth
+
+
+def randomPoses(t0):
+    T = np.tile(np.identity(4), (h, 1, 1))
+    rotvecs = np.linspace(0, 0.02, h)[:, None] * rng.randn(1, 3)
+    T[:, 0:3, 0:3] = Rotation.from_rotvec(rotvecs).as_matrix()
+    T[:, 0:3, 3] = t0 + np.linspace(0, 0.02, h)[:, None] * rng.randn(1, 3)
+    return T
+
+
+v1_lut = np.clip(np.indices((h, w))[0] +
+                 rng.randint(-2, 3, (h, w)), 0, h-1)
+
+depths = np.array([randomDepth(), randomDepth()]).astype(np.float32)
+KRK_i, Kt = rectifier.getRowPosesBatch(cam1, 0.02*rng.randn(2, 24), h)
+
+flow01 = (np.indices((h, w)).transpose(1, 2, 0)[:, :, ::-1] * 0.02 +
+          rng.randn(h, w, 2)).astype(np.float32)
+flow10 = -flow01 + 0.8*rng.randn(h, w, 2).astype(np.float32)
+
+flow_tri = np.empty([h, w, 2], dtype=np.float32)
+flow_tri[:, :, 0] = -16.0 + rng.randn(h, w)
+flow_tri[:, :, 1] = rng.randn(h, w)
+flow_tri[rng.rand(h, w) < 0.3] = np.nan
+
+points = rectifier.getPoints(depths[0], cam1)
+K1 = np.array([[cam1[0], 0, cam1[2]], [0, cam1[1], cam1[3]], [0, 0, 1]])
+
+inputs = {
+    'splat_flow': (depths, KRK_i, Kt),
+    'splat_points': (points['pixels'], points['points'], np.matmul(KRK_i[0], K1), Kt[0], (h, w)),
+    'gt_flow': (randomDepth(), cam1, randomPoses(np.zeros(3)), v1_lut),
+    'flow_bd': (flow01, flow10, 2),
+    'triangulate': (flow_tri, cam0, cam1, randomPoses(np.array([-0.1, 0, 0])), v1_lut),
+}
+
+print('{:<12} {:<10} {:>10} {:>10} {:>12}'.format(
+    'kernel', 'backend', 'ms/call', 'speedup', 'max diff'))
+failures = []
+for kernel in sorted(inputs.keys()):
+    args_k = inputs[kernel]
+    start = time.time()
+    res_ref = getKernel(kernel, 'reference')(*args_k)
+    t_ref = time.time()-start
+    for backend in getBackends(kernel):
+        fn = getKernel(kernel, backend)
+        res = fn(*args_k)  # warm up, e.g. JIT compilation
+        start = time.time()
+        for i in range(repeat if backend != 'reference' else 0):
+            res = fn(*args_k)
+        t = (time.time()-start) / repeat if backend != 'reference' else t_ref
+
+        # holes (nan) must agree, values up to floating point noise
+        holes = np.count_nonzero(np.isnan(res) != np.isnan(res_ref))
+        both = ~np.isnan(res) & ~np.isnan(res_ref)
+        diff = np.max(np.abs(res[both]-res_ref[both])) if np.any(both) else 0
+        print('{:<12} {:<10} {:>10.2f} {:>9.1f}x {:>12.2e}{}'.format(
+            kernel, backend, 1000*t, t_ref/t, diff,
+            '' if holes == 0 else '  ({} mismatched holes)'.format(holes)))
+        if holes > 0 or diff > tol:
+            failures.append('{}/{}'.format(kernel, backend))
+
+if len(failures) > 0:
+    print('Backends disagreeing with the reference: {}'.format(
+        ', '.join(failures)))
+    sys.exit(1)
+print('All backends agree with the reference (tol {:.0e})'.format(tol))
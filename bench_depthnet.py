@@ -0,0 +1,96 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# Latency vs. EPE of the DepthNet decoder exiting at coarser pyramid levels,
+# on the testing split with the anchors of the trained AnchorNet; every level
+# runs the multi-scale checkpoint of train_depth --aux_weight, the only one
+# with trained pr2/pr3 heads
+
+from __future__ import print_function, division
+import argparse
+import os
+import time
+import numpy as np
+
+from data_loader import dataLoader
+from rectifier import rectifier
+from evaluation import getEPE
+
+from model.depthnet import DepthNet
+from model.anchornet import AnchorNet
+from model.layers import getVariantSuffix
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict', default=4)
+parser.add_argument(
+    '--levels', help='Comma separated decoder exit levels', default='1,2,3')
+parser.add_argument(
+    '--frames', help='Number of testing frames, 0 for all', default=0)
+parser.add_argument(
+    '--batch_size', help='Frames per network forward pass', default=8)
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+print('Number of anchors to predict: {}'.format(num_anchor))
+levels = [int(l) for l in str(args.levels).split(',')]
+print('Exit levels: {}'.format(', '.join(str(l) for l in levels)))
+num_frames = int(args.frames)
+batch_size = int(args.batch_size)
+print('Batch size: {}'.format(batch_size))
+
+data_loader = dataLoader()
+imgs = data_loader.loadTestingImg()
+flows = data_loader.loadTestingFlow()
+if num_frames > 0:
+    imgs, flows = imgs[:num_frames], flows[:num_frames]
+print('Frames: {}'.format(len(imgs)))
+im_shape = data_loader.getImgShape()
+ckpt_path = os.path.join(os.getcwd(), 'checkpoints')
+
+anchornet = AnchorNet(im_shape, num_anchor)
+anchornet.model.load_weights(os.path.join(
+    ckpt_path, 'model_anchor{}.hdf5'.format(num_anchor)))
+anchors = anchornet.model.predict(imgs, batch_size=batch_size)
+
+rows, depths_ref, flows_ref = [], None, None
+for level in levels:
+    depthnet = DepthNet(im_shape, level)
+    depthnet.loadWeights(os.path.join(ckpt_path, 'model_depth{}.hdf5'.format(
+        getVariantSuffix(multi_scale=True))))
+    depthnet.model.predict(imgs[:batch_size, :, :, 0:1],
+                           batch_size=batch_size)  # warm up
+    start = time.time()
+    depths = depthnet.model.predict(imgs[:, :, :, 0:1], batch_size=batch_size)
+    t_depth = (time.time()-start) / len(imgs)
+
+    flows_pred = np.empty_like(flows)
+    for i in range(0, len(imgs), batch_size):
+        flows_pred[i:i+batch_size] = rectifier.getGS2RSFlowBatch(
+            depths[i:i+batch_size], data_loader.cam, anchors[i:i+batch_size])
+    epe = np.mean(getEPE(flows, flows_pred))
+    # against the first level, e.g. the full decoder
+    if depths_ref is None:
+        depths_ref, flows_ref = depths, flows_pred
+    epe_ref = np.nanmean(getEPE(flows_ref, flows_pred))
+    ratio = np.nanmedian(depths / depths_ref)
+    rows.append((level, im_shape[0] >> level, im_shape[1] >> level,
+                 1000*t_depth, epe, epe_ref, ratio))
+
+print('Level  Output   DepthNet ms/frame  EPE    EPE vs L{}  Depth ratio'.format(
+    levels[0]))
+for level, h, w, t_depth, epe, epe_ref, ratio in rows:
+    print('{:<6} {:>3}x{:<4} {:>17.2f}  {:.3f}  {:>9.3f}  {:>11.3f}'.format(
+        level, w, h, t_depth, epe, epe_ref, ratio))
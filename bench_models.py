@@ -0,0 +1,110 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# FLOPs, CPU latency and EPE of DepthNet + AnchorNet variants (backbone,
+# width multiplier, depthwise separable convolutions); EPE needs the variant
+# trained by train_depth / train_anchor with the same settings
+
+from __future__ import print_function, division
+import argparse
+import os
+import time
+import numpy as np
+from keras import backend as K
+
+from data_loader import dataLoader
+from rectifier import rectifier
+from evaluation import getEPE
+
+from model.depthnet import DepthNet
+from model.anchornet import AnchorNet
+from model.layers import getVariantSuffix, countFlops
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict', default=4)
+parser.add_argument(
+    '--variants', help='Comma separated base:width[:sep] model variants',
+    default='ResNet34:1.0,ResNet34:0.5:sep,MobileNetV2:1.0:sep,MobileNetV2:0.5:sep')
+parser.add_argument(
+    '--frames', help='Number of testing frames for the EPE, 0 for all', default=0)
+parser.add_argument(
+    '--repeat', help='Timed single frame forward passes per variant', default=20)
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+print('Number of anchors to predict: {}'.format(num_anchor))
+variants = []
+for spec in args.variants.split(','):
+    fields = spec.split(':')
+    variants.append((fields[0], float(fields[1]),
+                     len(fields) > 2 and fields[2] == 'sep'))
+num_frames = int(args.frames)
+num_repeat = int(args.repeat)
+
+data_loader = dataLoader()
+imgs = data_loader.loadTestingImg()
+flows = data_loader.loadTestingFlow()
+if num_frames > 0:
+    imgs, flows = imgs[:num_frames], flows[:num_frames]
+print('Frames: {}'.format(len(imgs)))
+im_shape = data_loader.getImgShape()
+ckpt_path = os.path.join(os.getcwd(), 'checkpoints')
+
+rows = []
+for base, width, separable in variants:
+    K.clear_session()
+    depthnet = DepthNet(im_shape, width=width, separable=separable)
+    anchornet = AnchorNet(im_shape, num_anchor, base, width, separable)
+    flops = [countFlops(depthnet.model), countFlops(anchornet.model)]
+
+    # single frame latency, as deployed on a CPU
+    img = imgs[:1]
+    depthnet.model.predict(img[:, :, :, 0:1])  # warm up
+    anchornet.model.predict(img)
+    t_depth, t_anchor = 0, 0
+    for i in range(num_repeat):
+        img = imgs[i % len(imgs)][None]
+        start = time.time()
+        depthnet.model.predict(img[:, :, :, 0:1])
+        t_depth += time.time()-start
+        start = time.time()
+        anchornet.model.predict(img)
+        t_anchor += time.time()-start
+
+    depth_ckpt = os.path.join(ckpt_path, 'model_depth{}.hdf5'.format(
+        getVariantSuffix(width, separable)))
+    anchor_ckpt = os.path.join(ckpt_path, 'model_anchor{}{}.hdf5'.format(
+        num_anchor, getVariantSuffix(width, separable, base)))
+    epe = np.nan
+    if os.path.exists(depth_ckpt) and os.path.exists(anchor_ckpt):
+        depthnet.loadWeights(depth_ckpt)
+        anchornet.model.load_weights(anchor_ckpt)
+        errs = []
+        for i in range(0, len(imgs), 8):
+            depths = depthnet.model.predict(imgs[i:i+8, :, :, 0:1])
+            anchors = anchornet.model.predict(imgs[i:i+8])
+            errs.extend(getEPE(flows[i:i+8], rectifier.getGS2RSFlowBatch(
+                depths, data_loader.cam, anchors)))
+        epe = np.mean(errs)
+    rows.append(('{}:{:g}{}'.format(base, width, ':sep' if separable else ''),
+                 flops[0]/1e9, flops[1]/1e9, 1000*t_depth/num_repeat,
+                 1000*t_anchor/num_repeat, epe))
+
+print('Variant                  GFLOPs depth/anchor  ms depth/anchor  EPE')
+for name, g_depth, g_anchor, t_depth, t_anchor, epe in rows:
+    print('{:<24} {:>8.2f} / {:<8.2f}  {:>6.1f} / {:<6.1f}  {}'.format(
+        name, g_depth, g_anchor, t_depth, t_anchor,
+        'untrained' if np.isnan(epe) else '{:.3f}'.format(epe)))
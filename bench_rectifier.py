@@ -0,0 +1,200 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+import argparse
+import time
+import cv2
+import numpy as np
+
+from rectifier import rectifier
+
+# read benchmark settings from command line
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors', default=4)
+parser.add_argument('--frames', help='Number of synthetic frames', default=8)
+parser.add_argument(
+    '--batch_size', help='Frames per getGS2RSFlowBatch call', default=8)
+parser.add_argument(
+    '--native_scale', help='Native to network resolution ratio', default=4)
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+num_frames = int(args.frames)
+batch_size = int(args.batch_size)
+native_scale = int(args.native_scale)
+print('Number of anchors: {}'.format(num_anchor))
+print('Number of frames: {}'.format(num_frames))
+print('Batch size: {}'.format(batch_size))
+
+# synthetic frames at the processed resolution, roughly like the TUM data
+h, w = 256, 320
+cam = np.array([160.0, 160.0, 160.0, 128.0, 0.0])
+rng = np.random.RandomState(0)
+depths, anchors = [], []
+for i in range(num_frames):
+    depth = 1.0 + 4.0*rng.rand(1, 1) + 0.1*rng.rand(h, w)
+    depth[rng.rand(h, w) < 0.3] = np.nan
+    depths.append(np.expand_dims(depth.astype(np.float32), -1))
+    anchor = np.empty(6*num_anchor)
+    anchor[:3*num_anchor] = 0.02*rng.randn(3*num_anchor)
+    anchor[3*num_anchor:] = 0.02*rng.randn(3*num_anchor)
+    anchors.append(anchor)
+
+
+def timeIt(fn):
+    flows = []
+    start = time.time()
+    for i in range(num_frames):
+        flows.append(fn(depths[i], cam, anchors[i]))
+    return (time.time()-start) / num_frames, flows
+
+
+t_loop, flows_loop = timeIt(rectifier.getGS2RSFlowLoop)
+t_vec, flows_vec = timeIt(rectifier.getGS2RSFlow)
+
+depths_stack, anchors_stack = np.array(depths), np.array(anchors)
+flows_batch = []
+start = time.time()
+for i in range(0, num_frames, batch_size):
+    flows_batch.extend(rectifier.getGS2RSFlowBatch(
+        depths_stack[i:i+batch_size], cam, anchors_stack[i:i+batch_size]))
+t_batch = (time.time()-start) / num_frames
+
+# per frame cost of the row poses and the whole batched flow by batch size
+batch_costs = []
+for bs in [1, 2, 4, 8]:
+    if bs > num_frames:
+        break
+    start = time.time()
+    for i in range(0, num_frames, bs):
+        rectifier.getRowPosesBatch(cam, anchors_stack[i:i+bs], h)
+    t_poses = (time.time()-start) / num_frames
+    start = time.time()
+    for i in range(0, num_frames, bs):
+        rectifier.getGS2RSFlowBatch(
+            depths_stack[i:i+bs], cam, anchors_stack[i:i+bs])
+    batch_costs.append((bs, t_poses, (time.time()-start) / num_frames))
+
+max_diff, mismatch = 0, 0
+for flow_loop, flow_vec in zip(flows_loop+flows_loop, flows_vec+flows_batch):
+    mismatch += np.count_nonzero(np.isnan(flow_loop) != np.isnan(flow_vec))
+    both = ~np.isnan(flow_loop) & ~np.isnan(flow_vec)
+    if np.any(both):
+        max_diff = max(max_diff, np.max(
+            np.abs(flow_loop[both]-flow_vec[both])))
+
+print('Loop:       {:.2f} ms/frame'.format(1000*t_loop))
+print('Vectorized: {:.2f} ms/frame'.format(1000*t_vec))
+print('Batched:    {:.2f} ms/frame'.format(1000*t_batch))
+print('Speedup:    {:.1f}x (vectorized), {:.1f}x (batched)'.format(
+    t_loop/t_vec, t_loop/t_batch))
+for bs, t_poses, t_flow in batch_costs:
+    print('Batch {}: poses {:.2f} ms/frame, flows {:.2f} ms/frame'.format(
+        bs, 1000*t_poses, 1000*t_flow))
+print('Mismatched holes: {}'.format(mismatch))
+print('Max flow diff:    {:.2e}'.format(max_diff))
+
+# dense remap maps: splat + hole filling vs. the direct inverse warp
+start = time.time()
+maps_flow = [rectifier.getMapsByFlow(rectifier.getGS2RSFlow(
+    depths[i], cam, anchors[i])) for i in range(num_frames)]
+t_maps_flow = (time.time()-start) / num_frames
+start = time.time()
+maps_depth = [rectifier.getMapsByDepth(depths[i], cam, anchors[i])
+              for i in range(num_frames)]
+t_maps_depth = (time.time()-start) / num_frames
+map_diffs = []
+for i in range(num_frames):
+    diff = np.sqrt(np.square(maps_flow[i][0]-maps_depth[i][0]) +
+                   np.square(maps_flow[i][1]-maps_depth[i][1]))
+    map_diffs.append(np.nanmedian(diff))
+print('Maps by flow:     {:.2f} ms/frame'.format(1000*t_maps_flow))
+print('Maps by depth:    {:.2f} ms/frame'.format(1000*t_maps_depth))
+print('Median map diff:  {:.3f} px'.format(np.mean(map_diffs)))
+
+# one motion shared by a stack of image streams
+imgs = (255*rng.rand(4, h, w, 3)).astype(np.uint8)
+maps_fixed = rectifier.toFixedPoint(maps_depth[0])
+start = time.time()
+imgs_float = rectifier.rectifyImgsByMaps(imgs, maps_depth[0])
+t_float = time.time()-start
+start = time.time()
+imgs_fixed = rectifier.rectifyImgsByMaps(imgs, maps_fixed)
+t_fixed = time.time()-start
+print('Remap 4 images, float maps: {:.2f} ms'.format(1000*t_float))
+print('Remap 4 images, fixed maps: {:.2f} ms'.format(1000*t_fixed))
+print('Max pixel diff:   {}'.format(
+    np.max(np.abs(imgs_float.astype(int)-imgs_fixed))))
+
+# maps computed at the network resolution, rectifying at the native one
+H, W = native_scale*h, native_scale*w
+cam_native = rectifier.scaleCam(cam, native_scale, native_scale)
+depth_native = cv2.resize(depths[0], (W, H), interpolation=cv2.INTER_NEAREST)
+img_native = (255*rng.rand(H, W, 3)).astype(np.uint8)
+start = time.time()
+maps_low = rectifier.getNativeMaps(depths[0], cam, anchors[0], (H, W))
+rectifier.rectifyImgByMaps(img_native, maps_low)
+t_low = time.time()-start
+start = time.time()
+maps_native = rectifier.getMapsByDepth(
+    depth_native, cam_native, anchors[0])
+rectifier.rectifyImgByMaps(img_native, maps_native)
+t_native = time.time()-start
+diff = np.sqrt(np.square(maps_low[0]-maps_native[0]) +
+               np.square(maps_low[1]-maps_native[1]))
+print('Native {}x{}, maps at network res: {:.2f} ms'.format(W, H, 1000*t_low))
+print('Native {}x{}, maps at native res:  {:.2f} ms'.format(
+    W, H, 1000*t_native))
+print('Median map diff:  {:.3f} native px'.format(np.median(diff)))
+
+# motion gate: the displacement estimated from the anchors alone should
+# bound the one of the maps (depth of the synthetic frames is at least 1 m)
+ratios = []
+for i in range(num_frames):
+    flow = rectifier.getFlowByMaps(maps_depth[i])
+    true_max = np.nanmax(np.sqrt(np.sum(np.square(flow), axis=-1)))
+    ratios.append(rectifier.getMaxDisplacement(
+        cam, anchors[i], (h, w)) / true_max)
+print('Estimated / true max displacement: {:.2f} min, {:.2f} max'.format(
+    np.min(ratios), np.max(ratios)))
+
+# depth reuse: a tilted plane seen while the camera keeps moving, the depth
+# of frame 0 warped along vs. the true depth of every frame
+n_plane, d_plane = np.array([-0.3, 0.0, 1.0]), 3.0  # n*P = d in frame 0
+rays = np.stack([(np.indices((h, w))[1]-cam[2])/cam[0],
+                 (np.indices((h, w))[0]-cam[3])/cam[1], np.ones((h, w))], -1)
+anchor = np.zeros(6*num_anchor)
+anchor[:3*num_anchor] = np.repeat(np.arange(1, num_anchor+1) / num_anchor, 3) * \
+    np.tile([0.02, 0.0, 0.01], num_anchor)
+anchor[3*num_anchor:] = np.repeat(np.arange(1, num_anchor+1) / num_anchor, 3) * \
+    np.tile([0.0, 0.01, 0.0], num_anchor)
+R, t = rectifier.getFramePose(anchor)
+depth_warped = np.expand_dims(d_plane/np.dot(rays, n_plane), -1)
+reuse_epes, t_warp = [], 0
+for k in range(1, 5):
+    n_plane = np.matmul(R, n_plane)
+    d_plane = d_plane + np.dot(n_plane, t)
+    depth_true = np.expand_dims(d_plane/np.dot(rays, n_plane), -1)
+    start = time.time()
+    depth_warped = rectifier.warpDepth(depth_warped, cam, R, t)
+    t_warp += time.time()-start
+    flow_true = rectifier.getGS2RSFlow(depth_true, cam, anchor)
+    flow_warped = rectifier.getGS2RSFlow(depth_warped, cam, anchor)
+    reuse_epes.append(np.nanmean(
+        np.sqrt(np.sum(np.square(flow_true-flow_warped), axis=-1))))
+print('Depth warp:       {:.2f} ms/frame'.format(1000*t_warp/4))
+print('Reused depth EPE: {} px (1-4 frames after the keyframe)'.format(
+    ', '.join('{:.3f}'.format(e) for e in reuse_epes)))
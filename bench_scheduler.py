@@ -0,0 +1,85 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Several camera streams sharing one Unroller through streamScheduler: one
+# busy stream submitting as fast as it can, the others at a fixed rate
+
+from __future__ import print_function, division
+import argparse
+import threading
+import time
+import numpy as np
+
+from scheduler import streamScheduler
+from unroller import Unroller
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict', default=4)
+parser.add_argument(
+    '--cam', help='fx,fy,cx,cy at the network resolution', default='160,160,160,128')
+parser.add_argument('--streams', help='Number of streams', default=4)
+parser.add_argument('--frames', help='Frames per stream', default=64)
+parser.add_argument('--fps', help='Rate of the paced streams', default=10)
+parser.add_argument('--batch_size', help='Most frames per batch', default=8)
+args = parser.parse_args()
+num_streams = int(args.streams)
+num_frames = int(args.frames)
+fps = float(args.fps)
+cam = np.array([float(c) for c in args.cam.split(',')])
+
+h, w = 256, 320
+unroller = Unroller((h, w), cam, int(args.anchor),
+                    max_batch=int(args.batch_size))
+rng = np.random.RandomState(0)
+frames = [(255*rng.rand(h, w, 3)).astype(np.uint8) for i in range(8)]
+
+# one stream at batch 1, the way a per-camera loop runs
+start = time.time()
+for i in range(num_frames):
+    unroller.rectify(frames[i % 8])
+t_single = (time.time()-start) / num_frames
+
+scheduler = streamScheduler(unroller, [cam]*num_streams)
+latencies = [[] for k in range(num_streams)]
+
+
+def produce(stream):
+    for i in range(num_frames):
+        submitted = time.time()
+        scheduler.submit(stream, frames[i % 8]).add_done_callback(
+            lambda future, t=submitted: latencies[stream].append(time.time()-t))
+        if stream > 0:
+            time.sleep(1/fps)
+
+
+threads = [threading.Thread(target=produce, args=(k,))
+           for k in range(num_streams)]
+start = time.time()
+for thread in threads:
+    thread.start()
+threading.Thread(target=lambda: [t.join() for t in threads]
+                 + [scheduler.close()]).start()
+scheduler.run()
+t_total = time.time()-start
+
+print('Batch 1 loop: {:.1f} frames/s'.format(1/t_single))
+print('Scheduler:    {:.1f} frames/s (paced streams bound the duration)'.format(
+    num_streams*num_frames/t_total))
+print('Batch sizes:  {}'.format(dict(sorted(scheduler.batch_sizes.items()))))
+for k in range(num_streams):
+    print('Stream {} ({}): {:.1f} ms median latency, {:.1f} ms p95'.format(
+        k, 'busy' if k == 0 else '{:g} fps'.format(fps),
+        1000*np.median(latencies[k]), 1000*np.percentile(latencies[k], 95)))
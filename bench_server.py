@@ -0,0 +1,59 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Throughput of a running server.py under concurrent local clients
+
+from __future__ import print_function, division
+import argparse
+import time
+import numpy as np
+from multiprocessing import Pool
+
+from client import DEFAULT_ADDRESS, unrollingClient
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--socket', help='Unix socket of the server',
+                    default=DEFAULT_ADDRESS)
+parser.add_argument('--clients', help='Concurrent client processes', default=8)
+parser.add_argument('--frames', help='Requests per client', default=32)
+parser.add_argument('--op', help='rectify or flow', default='rectify')
+args = parser.parse_args()
+num_clients = int(args.clients)
+num_frames = int(args.frames)
+print('Clients: {}'.format(num_clients))
+print('Requests per client: {}'.format(num_frames))
+
+
+def runClient(seed):
+    client = unrollingClient(args.socket)
+    rng = np.random.RandomState(seed)
+    frame = rng.randint(0, 256, client.im_shape+(3,)).astype(np.uint8)
+    latencies = []
+    for i in range(num_frames):
+        start = time.time()
+        client.call(args.op, frame)
+        latencies.append(time.time()-start)
+    client.close()
+    return latencies
+
+
+start = time.time()
+with Pool(num_clients) as pool:
+    latencies = np.concatenate(pool.map(runClient, range(num_clients)))
+t = time.time()-start
+print('Throughput: {:.1f} frames/s'.format(latencies.shape[0]/t))
+print('Latency:    {:.1f} ms median, {:.1f} ms p95'.format(
+    1000*np.median(latencies), 1000*np.percentile(latencies, 95)))
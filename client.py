@@ -0,0 +1,101 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Client of server.py: frames and results travel through memory mapped files
+# in SHM_DIR, created and removed by the client; only small json messages go
+# through the socket
+
+from __future__ import division, absolute_import
+import itertools
+import json
+import os
+import socket
+import tempfile
+import numpy as np
+
+DEFAULT_ADDRESS = '/tmp/unrolling.sock'
+# tmpfs where available, so the files never touch a disk
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+SHM_PREFIX = 'unrolling_'
+
+
+def isBufferPath(path):
+    # the server only maps files a client created
+    return os.path.dirname(path) == SHM_DIR and \
+        os.path.basename(path).startswith(SHM_PREFIX)
+
+
+class unrollingClient():
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.file = self.sock.makefile('rwb')
+        self.bufs = {'in': None, 'out': None}
+        self.counter = itertools.count()
+        self.im_shape = tuple(self.request({'op': 'info'})['im_shape'])
+
+    def request(self, msg):
+        self.file.write((json.dumps(msg)+'\n').encode())
+        self.file.flush()
+        reply = json.loads(self.file.readline().decode())
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def getBuffer(self, key, nbytes):
+        # mapped files grow with the largest payload seen, under a new name
+        buf = self.bufs[key]
+        if buf is None or buf.size < nbytes:
+            if buf is not None:
+                self.removeBuffer(buf)
+            path = os.path.join(SHM_DIR, '{}{}_{}_{}'.format(
+                SHM_PREFIX, os.getpid(), id(self), next(self.counter)))
+            buf = np.memmap(path, np.uint8, 'w+', shape=(nbytes,))
+            self.bufs[key] = buf
+        return buf
+
+    def removeBuffer(self, buf):
+        # the server may still map it, which keeps the memory until it moves on
+        os.remove(buf.filename)
+
+    def call(self, op, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        buf_in = self.getBuffer('in', frame.nbytes)
+        buf_in[:frame.nbytes].reshape(frame.shape)[:] = frame
+        if op == 'rectify':
+            out_bytes = frame.nbytes
+        else:
+            out_bytes = self.im_shape[0]*self.im_shape[1]*2*4
+        buf_out = self.getBuffer('out', out_bytes)
+        reply = self.request({'op': op, 'in': buf_in.filename, 'out': buf_out.filename,
+                              'shape': list(frame.shape)})
+        dtype = np.dtype(reply['dtype'])
+        nbytes = int(np.prod(reply['shape']))*dtype.itemsize
+        return np.array(buf_out[:nbytes].view(dtype).reshape(reply['shape']))
+
+    def rectify(self, frame):
+        return self.call('rectify', frame)
+
+    def predictFlow(self, frame):
+        return self.call('flow', frame)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+        for key in self.bufs:
+            if self.bufs[key] is not None:
+                self.removeBuffer(self.bufs[key])
+                self.bufs[key] = None
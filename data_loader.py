@@ -22,6 +22,8 @@ import csv
 import math
 from numpy import linalg as LA
 
+from rectifier import rectifier
+
 
 class dataLoader():
     def __init__(self):
@@ -32,6 +34,7 @@ class dataLoader():
 
         # get training paths
         self.img_paths, self.flow_paths, self.depth_paths = [], [], []
+        self.points_paths, self.rectified_gt_paths = [], []
         self.accs = np.empty((0, 6))
         for seq in range(1, num_seqs+1):
             seq_path = os.path.join(data_path, 'seq'+str(seq))
@@ -44,6 +47,10 @@ class dataLoader():
                     seq_path, "cam1/flows_gs2rs/", str(fi)+'.npy'))
                 self.depth_paths.append(os.path.join(
                     seq_path, "cam1/depth/", str(fi)+'.npy'))
+                self.points_paths.append(os.path.join(
+                    seq_path, "cam1/points/", str(fi)+'.npz'))
+                self.rectified_gt_paths.append(os.path.join(
+                    seq_path, "cam1/rectified_gt/", str(fi)+'.png'))
 
             cur_accs = np.load(os.path.join(seq_path, "cam1/acc_t_r.npy"))
             self.accs = np.concatenate((self.accs, cur_accs))
@@ -124,6 +131,47 @@ class dataLoader():
     def loadSeqDepth(self):
         return self.loadDepth(self.seq_idx)
 
+    def loadPoints(self, idx):
+        # back-projected depth, saved next to the depth on first use
+        points = []
+        for i in range(0, idx.shape[0], self.step):
+            points_path = self.points_paths[idx[i]]
+            if not os.path.exists(points_path):
+                depth = np.load(self.depth_paths[idx[i]])
+                rectifier.savePoints(
+                    points_path, rectifier.getPoints(depth, self.cam))
+            points.append(rectifier.loadPoints(points_path))
+        return points
+
+    def loadTestingPoints(self):
+        return self.loadPoints(self.test_idx)
+
+    def loadSeqPoints(self):
+        return self.loadPoints(self.seq_idx)
+
+    def loadRectifiedGT(self, idx):
+        # (uint8) images rectified by the ground-truth flow, saved next to
+        # the flow on first use
+        imgs = []
+        for i in range(0, idx.shape[0], self.step):
+            img_path = self.rectified_gt_paths[idx[i]]
+            if not os.path.exists(img_path):
+                if not os.path.exists(os.path.dirname(img_path)):
+                    os.makedirs(os.path.dirname(img_path))
+                img = cv2.imread(self.img_paths[idx[i]]) / 255
+                flow = np.load(self.flow_paths[idx[i]])
+                img_gt = rectifier.rectifyImgByFlow(255*img, flow)
+                cv2.imwrite(img_path, np.clip(
+                    np.rint(img_gt), 0, 255).astype(np.uint8))
+            imgs.append(cv2.imread(img_path))
+        return np.array(imgs)
+
+    def loadTestingRectifiedGT(self):
+        return self.loadRectifiedGT(self.test_idx)
+
+    def loadSeqRectifiedGT(self):
+        return self.loadRectifiedGT(self.seq_idx)
+
     def loadFlow(self, idx):
         flows = []
         for i in range(0, idx.shape[0], self.step):
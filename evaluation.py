@@ -0,0 +1,145 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import division, absolute_import
+import hashlib
+import os
+import cv2
+import numpy as np
+
+from rectifier import rectifier
+
+
+def getEPE(flows_gt, flows_pred):
+    # mean end point error of every frame in a (b, h, w, 2) stack
+    return np.nanmean(np.sqrt(np.sum(np.square(flows_gt-flows_pred), axis=-1)), axis=(1, 2))
+
+
+def toUint8(img):
+    # the same rounding and saturation as cv2.imwrite of a float image
+    return np.clip(np.rint(img), 0, 255).astype(np.uint8)
+
+
+def evaluateBatch(batch, cam, direct_maps=False, rectify_img=False):
+    # flow synthesis, EPE and optional rectification of one batch of network
+    # predictions; anchors and depths are None without a network, depths
+    # only hold the frames that are neither rotation only nor skipped (left
+    # as they are); imgs_gt are the cached ground-truth rectified images, or
+    # None to rectify here
+    imgs_rgb, flows_gt, anchors, depths, rot_only, skip, imgs_gt = batch
+    maps_pred = {}
+    flows_pred = np.zeros_like(flows_gt)
+    if anchors is not None:
+        for j in np.flatnonzero(rot_only):
+            maps_pred[j] = rectifier.getMapsByRotation(
+                cam, anchors[j], flows_gt.shape[1:])
+            flows_pred[j] = rectifier.getFlowByMaps(maps_pred[j])
+        depth_idx = np.flatnonzero(~rot_only & ~skip)
+        if depth_idx.shape[0] > 0:
+            flows_pred[depth_idx] = rectifier.getGS2RSFlowBatch(
+                depths[depth_idx], cam, anchors[depth_idx])
+
+    # depth summary (min, median, max), nan where depth was not used
+    depth_stats = np.full([flows_gt.shape[0], 3], np.nan, dtype=np.float32)
+    if anchors is not None:
+        for j in np.flatnonzero(~rot_only & ~skip):
+            depth_stats[j] = np.nanpercentile(depths[j], [0, 50, 100])
+
+    res = {'pred_dist': getEPE(flows_gt, flows_pred),
+           'zero_dist': getEPE(flows_gt, 0),
+           'rot_only': rot_only,
+           'skipped': skip,
+           'anchors': anchors,
+           'depth_stats': depth_stats,
+           'imgs_res': []}
+    if rectify_img:
+        for j in range(flows_gt.shape[0]):
+            img_rgb = 255*imgs_rgb[j]
+            if skip[j]:
+                img_rectified = img_rgb
+            elif rot_only[j]:
+                img_rectified = rectifier.rectifyImgByMaps(
+                    img_rgb, maps_pred[j])
+            elif direct_maps and anchors is not None:
+                img_rectified = rectifier.rectifyImgByDepth(
+                    img_rgb, depths[j], cam, anchors[j])
+            else:
+                img_rectified = rectifier.rectifyImgByFlow(
+                    img_rgb, flows_pred[j])
+            if imgs_gt is None:
+                img_rectified_gt = toUint8(
+                    rectifier.rectifyImgByFlow(img_rgb, flows_gt[j]))
+            else:
+                img_rectified_gt = imgs_gt[j]
+            res['imgs_res'].append(cv2.hconcat(
+                [toUint8(img_rgb), toUint8(img_rectified), img_rectified_gt]))
+    return res
+
+
+def hashFile(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class resultCache():
+    # per-frame evaluation results of one anchor count, keyed by the
+    # checkpoints, the rectifier version and the evaluation settings; rows
+    # are keyed by the dataset index of the frame, so a changed testing split
+    # only evaluates the new frames, but re-processed data under the same
+    # indices is not noticed
+    def __init__(self, cache_path, num_anchor, ckpt_paths, settings=()):
+        sha = hashlib.sha1()
+        for ckpt_path in ckpt_paths:
+            sha.update(hashFile(ckpt_path).encode())
+        sha.update(repr((rectifier.version,) + tuple(settings)).encode())
+        self.path = os.path.join(cache_path, 'results{}_{}.npz'.format(
+            num_anchor, sha.hexdigest()[:16]))
+        self.num_anchor = num_anchor
+        self.rows = {}
+        if os.path.exists(self.path):
+            with np.load(self.path) as cached:
+                for i, frame in enumerate(cached['frames']):
+                    self.rows[frame] = {key: cached[key][i] for key in cached.files
+                                        if key != 'frames'}
+
+    def missing(self, frames):
+        return np.array([frame not in self.rows for frame in frames], dtype=bool)
+
+    def update(self, frames, res):
+        # res as returned by evaluateBatch, for these frames
+        anchors = res['anchors']
+        if anchors is None:
+            anchors = np.zeros([len(frames), 6*self.num_anchor])
+        for i, frame in enumerate(frames):
+            self.rows[frame] = {'pred_dist': res['pred_dist'][i],
+                                'zero_dist': res['zero_dist'][i],
+                                'rot_only': res['rot_only'][i],
+                                'skipped': res['skipped'][i],
+                                'anchors': anchors[i],
+                                'depth_stats': res['depth_stats'][i]}
+
+    def get(self, frames):
+        return {key: np.array([self.rows[frame][key] for frame in frames])
+                for key in ['pred_dist', 'zero_dist', 'rot_only', 'skipped', 'anchors', 'depth_stats']}
+
+    def save(self):
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        frames = sorted(self.rows.keys())
+        np.savez(self.path, frames=np.array(frames), **self.get(frames))
@@ -0,0 +1,96 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Fuse the trained DepthNet and AnchorNet with the flow synthesis and warp
+# into one model: rgb frame in, rectified frame (and flow) out
+
+from __future__ import print_function, division
+import argparse
+import os
+import time
+import numpy as np
+
+from data_loader import dataLoader
+from rectifier import rectifier
+
+from model.unrollnet import UnrollNet, loadUnrollNet
+from model.layers import getVariantSuffix
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict')
+parser.add_argument(
+    '--iters', help='Fixed point iterations of the inverse warp', default=4)
+parser.add_argument(
+    '--output_flow', help='Whether the model also outputs the flow', default=1)
+parser.add_argument(
+    '--check', help='Number of testing frames to compare against test.py, 0 to skip', default=16)
+parser.add_argument(
+    '--width', help='Width multiplier of the model variant', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether the model variant uses depthwise separable convolutions', default=0)
+parser.add_argument(
+    '--base', help='AnchorNet backbone of the model variant', default='ResNet34')
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+print('Number of anchors to predict: {}'.format(num_anchor))
+iters = int(args.iters)
+print('Iterations: {}'.format(iters))
+output_flow = True if int(args.output_flow) > 0 else False
+print('Output flow: {}'.format(output_flow))
+num_check = int(args.check)
+print('Frames to check: {}'.format(num_check))
+width = float(args.width)
+separable = True if int(args.separable) > 0 else False
+base = args.base
+print('Model variant: {}, width {}, separable {}'.format(base, width, separable))
+suffix = getVariantSuffix(width, separable, base)
+
+data_loader = dataLoader()
+unrollnet = UnrollNet(data_loader.getImgShape(), num_anchor, data_loader.cam,
+                      iters, output_flow, width, separable, base)
+unrollnet.loadWeights(os.path.join(os.getcwd(), 'checkpoints/model_depth{}.hdf5'.format(getVariantSuffix(width, separable))),
+                      os.path.join(os.getcwd(), 'checkpoints/model_anchor{}{}.hdf5'.format(num_anchor, suffix)))
+save_path = os.path.join(
+    os.getcwd(), 'checkpoints/model_unroll{}{}.hdf5'.format(num_anchor, suffix))
+unrollnet.model.save(save_path)
+print('Saved to {}'.format(save_path))
+
+if num_check > 0 and output_flow:
+    imgs = data_loader.loadTestingImg()[:num_check]
+    flows = data_loader.loadTestingFlow()[:num_check]
+    # the saved file, as another program loads it
+    fused = loadUnrollNet(save_path)
+    fused.predict(imgs[:1])  # warm up
+    start = time.time()
+    _, flows_fused = fused.predict(imgs)
+    t_fused = (time.time()-start) / len(imgs)
+
+    errs_fused, errs_split = [], []
+    start = time.time()
+    for i in range(len(imgs)):
+        depth = unrollnet.depthnet.model.predict(imgs[i:i+1, :, :, 0:1])[0]
+        anchor = unrollnet.anchornet.model.predict(imgs[i:i+1])[0]
+        flow_pred = rectifier.getGS2RSFlow(depth, data_loader.cam, anchor)
+        errs_split.append(np.nanmean(
+            np.sqrt(np.sum(np.square(flows[i]-flow_pred), axis=-1))))
+    t_split = (time.time()-start) / len(imgs)
+    for i in range(len(imgs)):
+        errs_fused.append(np.nanmean(
+            np.sqrt(np.sum(np.square(flows[i]-flows_fused[i]), axis=-1))))
+    print('Fused EPE errs: {:.3f} ({:.2f} ms/frame)'.format(
+        np.mean(errs_fused), 1000*t_fused))
+    print('Split EPE errs: {:.3f} ({:.2f} ms/frame)'.format(
+        np.mean(errs_split), 1000*t_split))
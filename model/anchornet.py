@@ -20,19 +20,27 @@ from keras.models import Model
 from keras.layers import Conv2D, BatchNormalization, Activation, Flatten
 from classification_models.keras import Classifiers
 from keras.applications.vgg16 import VGG16
+from keras.applications.mobilenet_v2 import MobileNetV2
 
+from model.layers import conv, scaleFilters
 
-def Conv2d_BN_Relu(x, filters, kernel_size, name, strides=(1, 1), padding='same'):
-    x = Conv2D(filters, kernel_size, padding=padding,
-               strides=strides, name=name+'_conv')(x)
+
+def Conv2d_BN_Relu(x, filters, kernel_size, name, strides=(1, 1), padding='same', separable=False):
+    x = conv(filters, kernel_size, separable, padding=padding,
+             strides=strides, name=name+'_conv')(x)
     x = BatchNormalization(axis=3, name=name+'_bn')(x)
     x = Activation('relu')(x)
     return x
 
 
 class AnchorNet():
-    def __init__(self, im_shape, num_anchor, base='ResNet34'):
+    # width scales the channels of the head (and of a MobileNetV2 base, whose
+    # ImageNet weights exist for width 0.35, 0.5, 0.75, 1.0, 1.3 and 1.4);
+    # separable makes the 3x3 convolutions of the head depthwise separable
+    def __init__(self, im_shape, num_anchor, base='ResNet34', width=1.0, separable=False):
         self.num_anchor = num_anchor
+        self.width = width
+        self.separable = separable
 
         if base == 'ResNet34':
             ResNet34, _ = Classifiers.get('resnet34')
@@ -48,18 +56,20 @@ class AnchorNet():
             vgg = VGG16(input_shape=(im_shape[0], im_shape[1], 3),
                         include_top=False, weights='imagenet')
             input, features = vgg.input, vgg.get_layer('block5_pool').output
+        elif base == 'MobileNetV2':
+            mobilenet = MobileNetV2(input_shape=(im_shape[0], im_shape[1], 3),
+                                    alpha=width, include_top=False, weights='imagenet')
+            input, features = mobilenet.input, mobilenet.output
 
         vel = self.AnchorNet(features)
         self.model = Model(inputs=input, outputs=vel)
 
     def AnchorNet(self, input):
         # AnchorNet
-        x = Conv2d_BN_Relu(input, filters=512,
-                           kernel_size=(3, 3), name='V0')
-        x = Conv2d_BN_Relu(x, filters=256, kernel_size=(3, 3), name='V1')
-        x = Conv2d_BN_Relu(x, filters=128, kernel_size=(3, 3), name='V2')
-        x = Conv2d_BN_Relu(x, filters=64, kernel_size=(3, 3), name='V3')
-        x = Conv2d_BN_Relu(x, filters=32, kernel_size=(3, 3), name='V4')
+        x = input
+        for i, filters in enumerate([512, 256, 128, 64, 32]):
+            x = Conv2d_BN_Relu(x, filters=scaleFilters(filters, self.width), kernel_size=(3, 3),
+                               name='V'+str(i), separable=self.separable)
 
         x_shape = x.get_shape().as_list()
         anchors = Conv2D(
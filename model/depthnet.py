@@ -16,66 +16,100 @@
 
 from __future__ import absolute_import, division, print_function
 from keras.models import Input, Model
-from keras.layers import Conv2D, Conv2DTranspose, BatchNormalization, Activation, Concatenate, UpSampling2D
+from keras.layers import Conv2D, Conv2DTranspose, BatchNormalization, Activation, Concatenate, UpSampling2D, Lambda
 import tensorflow as tf
 
+from model.layers import conv, scaleFilters
 
-def iconv_pr(input, pr_prv, conv, filters, lvl):
+
+def iconv_pr(input, pr_prv, conv_prv, filters, lvl, separable=False):
     upconv = Conv2DTranspose(
         filters, kernel_size=4, strides=2, padding='same', name='upconv'+str(lvl))(input)
     upconv = Activation('relu')(BatchNormalization(
         axis=3, name='upconv{}bn'.format(lvl))(upconv))
     pr_prv_upsampled = UpSampling2D(name='prupsample'+str(lvl))(pr_prv)
-    upconv_prprv_conv = Concatenate(axis=3)([upconv, pr_prv_upsampled, conv])
-    iconv = Activation('relu')(Conv2D(filters, kernel_size=3, strides=1,
-                                      padding='same', name='iconv'+str(lvl))(upconv_prprv_conv))
+    upconv_prprv_conv = Concatenate(axis=3)([upconv, pr_prv_upsampled, conv_prv])
+    iconv = Activation('relu')(conv(filters, kernel_size=3, separable=separable, strides=1,
+                                    padding='same', name='iconv'+str(lvl))(upconv_prprv_conv))
     pr = Activation('relu')(Conv2D(1, kernel_size=3, strides=1,
                                    padding='same', name='pr'+str(lvl))(iconv))
     return [iconv, pr]
 
 
-def DispNet(img_input):
+def DispNet(img_input, exit_level=1, width=1.0, separable=False):
+    # width scales every channel count but the outputs; separable makes
+    # every convolution on more than one channel depthwise separable
+    def f(filters):
+        return scaleFilters(filters, width)
+
     # encoder
     conv1 = Activation('relu')(
-        Conv2D(64, kernel_size=7, strides=2, padding='same', name='conv1')(img_input))
+        Conv2D(f(64), kernel_size=7, strides=2, padding='same', name='conv1')(img_input))
     conv2 = Activation('relu')(
-        Conv2D(128, kernel_size=5, strides=2, padding='same', name='conv2')(conv1))
+        conv(f(128), 5, separable, strides=2, padding='same', name='conv2')(conv1))
     conv3a = Activation('relu')(
-        Conv2D(256, kernel_size=5, strides=2, padding='same', name='conv3a')(conv2))
+        conv(f(256), 5, separable, strides=2, padding='same', name='conv3a')(conv2))
     conv3b = Activation('relu')(
-        Conv2D(256, kernel_size=3, strides=1, padding='same', name='conv3b')(conv3a))
+        conv(f(256), 3, separable, strides=1, padding='same', name='conv3b')(conv3a))
     conv4a = Activation('relu')(
-        Conv2D(512, kernel_size=3, strides=2, padding='same', name='conv4a')(conv3b))
+        conv(f(512), 3, separable, strides=2, padding='same', name='conv4a')(conv3b))
     conv4b = Activation('relu')(
-        Conv2D(512, kernel_size=3, strides=1, padding='same', name='conv4b')(conv4a))
+        conv(f(512), 3, separable, strides=1, padding='same', name='conv4b')(conv4a))
     conv5a = Activation('relu')(
-        Conv2D(512, kernel_size=3, strides=2, padding='same', name='conv5a')(conv4b))
+        conv(f(512), 3, separable, strides=2, padding='same', name='conv5a')(conv4b))
     conv5b = Activation('relu')(
-        Conv2D(512, kernel_size=3, strides=1, padding='same', name='conv5b')(conv5a))
+        conv(f(512), 3, separable, strides=1, padding='same', name='conv5b')(conv5a))
     conv6a = Activation('relu')(
-        Conv2D(1024, kernel_size=3, strides=2, padding='same', name='conv6a')(conv5b))
+        conv(f(1024), 3, separable, strides=2, padding='same', name='conv6a')(conv5b))
     conv6b = Activation('relu')(
-        Conv2D(1024, kernel_size=3, strides=1, padding='same', name='conv6b')(conv6a))
+        conv(f(1024), 3, separable, strides=1, padding='same', name='conv6b')(conv6a))
 
     pr6 = Activation('relu')(
         Conv2D(1, kernel_size=3, strides=1, padding='same', name='pr6')(conv6a))
 
-    # decoder
-    [iconv5, pr5] = iconv_pr(conv6b, pr6, conv5b, 512, 5)
-    [iconv4, pr4] = iconv_pr(iconv5, pr5, conv4b, 256, 4)
-    [iconv3, pr3] = iconv_pr(iconv4, pr4, conv3b, 128, 3)
-    [iconv2, pr2] = iconv_pr(iconv3, pr3, conv2, 64, 2)
-    [iconv1, pr1] = iconv_pr(iconv2, pr2, conv1, 32, 1)
+    # decoder, down to pr{exit_level}
+    prs = [pr6]
+    iconv = conv6b
+    for lvl, conv_skip, filters in [(5, conv5b, 512), (4, conv4b, 256), (3, conv3b, 128),
+                                    (2, conv2, 64), (1, conv1, 32)]:
+        if lvl < exit_level:
+            break
+        [iconv, pr] = iconv_pr(iconv, prs[-1], conv_skip,
+                               f(filters), lvl, separable)
+        prs.append(pr)
+
+    return prs
 
-    return [pr6, pr5, pr4, pr3, pr2, pr1]
+
+def resizeBilinear(x, size):
+    return tf.image.resize_bilinear(x, size)
 
 
 class DepthNet():
-    def __init__(self, im_shape):
+    # exit_level > 1 (inference only): stop the decoder at pr{exit_level},
+    # 1/2^exit_level of the input resolution, and upsample it bilinearly;
+    # its head is only trained with aux_levels (train_depth --aux_weight),
+    # whose weights load by name; width and separable select a lighter
+    # variant, trained on its own
+    def __init__(self, im_shape, exit_level=1, width=1.0, separable=False, aux_levels=()):
+        self.exit_level = exit_level
         img = Input(shape=(im_shape[0], im_shape[1], 1))
-        [pr6, pr5, pr4, pr3, pr2, pr1] = DispNet(img)
-        depth = UpSampling2D(name='y_pred')(pr1)
-        self.model = Model(input=img, output=depth)
+        prs = DispNet(img, exit_level, width, separable)
+        if exit_level == 1:
+            depth = UpSampling2D(name='y_pred')(prs[-1])
+        else:
+            depth = Lambda(resizeBilinear, name='y_pred', arguments={
+                           'size': (im_shape[0], im_shape[1])})(prs[-1])
+        # training only: the coarser heads upsampled as extra outputs
+        aux_depths = [Lambda(resizeBilinear, name='y_pred{}'.format(level), arguments={
+                      'size': (im_shape[0], im_shape[1])})(prs[6-level]) for level in aux_levels]
+        if len(aux_depths) > 0:
+            self.model = Model(input=img, output=[depth]+aux_depths)
+        else:
+            self.model = Model(input=img, output=depth)
+
+    def loadWeights(self, ckpt_path):
+        self.model.load_weights(ckpt_path, by_name=self.exit_level > 1)
 
     def depthLoss(self, y_true, y_pred):
         diff = tf.where(tf.is_nan(y_true),
@@ -0,0 +1,74 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import absolute_import, division, print_function
+from keras.layers import Conv2D, SeparableConv2D
+
+
+def scaleFilters(filters, width):
+    # width multiplier, at least 8 channels
+    return max(8, int(round(filters*width)))
+
+
+def conv(filters, kernel_size, separable=False, **kwargs):
+    # Conv2D or its depthwise separable counterpart, under the same name
+    if separable:
+        return SeparableConv2D(filters, kernel_size, **kwargs)
+    return Conv2D(filters, kernel_size, **kwargs)
+
+
+def getVariantSuffix(width=1.0, separable=False, base='ResNet34', multi_scale=False):
+    # checkpoint name suffix of a model variant, empty for the original one;
+    # multi_scale: DepthNet trained on its coarser heads as well
+    suffix = '' if base == 'ResNet34' else '_'+base.lower()
+    if width != 1.0:
+        suffix += '_w{:g}'.format(width)
+    if separable:
+        suffix += '_sep'
+    if multi_scale:
+        suffix += '_ms'
+    return suffix
+
+
+def countFlops(model):
+    # multiply-adds of the convolutions and dense layers of a Keras model
+    # (nested models included) for one frame, x2 for FLOPs
+    macs = 0
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ('Model', 'Sequential'):
+            macs += countFlops(layer) // 2
+        elif kind == 'SeparableConv2D':
+            h, w, c = layer.output_shape[1:4]
+            kh, kw = layer.kernel_size
+            c_in, m = layer.input_shape[-1], layer.depth_multiplier
+            macs += h*w*(kh*kw*c_in*m + c_in*m*c)
+        elif kind == 'DepthwiseConv2D':
+            h, w = layer.output_shape[1:3]
+            kh, kw = layer.kernel_size
+            macs += h*w*kh*kw*layer.input_shape[-1]*layer.depth_multiplier
+        elif kind == 'Conv2DTranspose':
+            h, w, c_in = layer.input_shape[1:4]
+            kh, kw = layer.kernel_size
+            macs += h*w*kh*kw*c_in*layer.filters
+        elif kind == 'Conv2D':
+            h, w, c = layer.output_shape[1:4]
+            kh, kw = layer.kernel_size
+            macs += h*w*kh*kw*layer.input_shape[-1]*c
+        elif kind == 'Dense':
+            macs += layer.input_shape[-1]*layer.units
+    return 2*macs
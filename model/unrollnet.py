@@ -0,0 +1,225 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+import tensorflow as tf
+from keras.models import Model, load_model
+from keras.layers import Input, Layer
+
+from rectifier import rectifier
+from model.depthnet import DepthNet
+from model.anchornet import AnchorNet
+
+
+def rodrigues(rotvecs):
+    # (..., 3) rotation vectors to (..., 3, 3) rotation matrices
+    theta = tf.sqrt(tf.reduce_sum(tf.square(rotvecs), -1, keepdims=True)+1e-12)
+    k = rotvecs / theta
+    zeros = tf.zeros_like(k[..., 0])
+    k_x = tf.stack([tf.stack([zeros, -k[..., 2], k[..., 1]], -1),
+                    tf.stack([k[..., 2], zeros, -k[..., 0]], -1),
+                    tf.stack([-k[..., 1], k[..., 0], zeros], -1)], -2)
+    sin, cos = tf.sin(theta)[..., None], tf.cos(theta)[..., None]
+    eye = tf.eye(3, batch_shape=[1, 1])
+    return eye + sin*k_x + (1-cos)*tf.matmul(k_x, k_x)
+
+
+def getRowPoses(anchors, cam, t_basis):
+    # (B, 6N) anchors to per-row (B, h, 3, 3) K*R*K_i and (B, h, 3) K*t;
+    # rotation vectors share the cubic basis of the translations, which
+    # matches the rotation spline for the small rotations between anchors
+    basis = tf.constant(t_basis, dtype=tf.float32)  # (h, N)
+    num_anchor = len(t_basis[0])
+    ts = tf.reshape(anchors[:, :(3*num_anchor)], (-1, num_anchor, 3))
+    rs = tf.reshape(anchors[:, (3*num_anchor):], (-1, num_anchor, 3))
+    t_rows = tf.einsum('hn,bnc->bhc', basis, ts)
+    R_rows = rodrigues(tf.einsum('hn,bnc->bhc', basis, rs))
+
+    K = tf.constant([[cam[0], 0, cam[2]], [0, cam[1], cam[3]], [0, 0, 1]],
+                    dtype=tf.float32)
+    K_i = tf.matrix_inverse(K)
+    KRK_i = tf.einsum('ij,bhjk->bhik', K, R_rows)
+    KRK_i = tf.einsum('bhik,kl->bhil', KRK_i, K_i)
+    Kt = tf.einsum('ij,bhj->bhi', K, t_rows)
+    return KRK_i, Kt
+
+
+def getFlowRS(inputs, cam, t_basis):
+    # dense flow x_rs - x_gs on the rs grid from depth and anchors,
+    # non-finite flow set to 0 like rectifier.getMapsByDepth
+    depth, anchors = inputs
+    depth = depth[:, :, :, 0]
+    h, w = len(t_basis), depth.get_shape().as_list()[2]
+    KRK_i, Kt = getRowPoses(anchors, cam, t_basis)
+
+    u = tf.range(w, dtype=tf.float32)[None, None, :]
+    v = tf.range(h, dtype=tf.float32)[None, :, None]
+    p = []
+    for i in range(3):
+        q = KRK_i[:, :, i, 0, None]*u + KRK_i[:, :, i, 1, None]*v + \
+            KRK_i[:, :, i, 2, None]
+        p.append(depth*q + Kt[:, :, i, None])
+    flow = tf.stack([u-p[0]/p[2], v-p[1]/p[2]], -1)
+    return tf.where(tf.is_finite(flow), flow, tf.zeros_like(flow))
+
+
+def sampleBilinear(img, map_x, map_y, replicate):
+    # cv2.remap with INTER_LINEAR, borders either replicated or zero
+    h, w = img.get_shape().as_list()[1:3]
+    batch = tf.shape(img)[0]
+    b = tf.tile(tf.range(batch)[:, None, None], [1, h, w])
+    x0, y0 = tf.floor(map_x), tf.floor(map_y)
+    wx, wy = (map_x-x0)[..., None], (map_y-y0)[..., None]
+
+    def gather(x, y):
+        xi = tf.cast(tf.clip_by_value(x, 0, w-1), tf.int32)
+        yi = tf.cast(tf.clip_by_value(y, 0, h-1), tf.int32)
+        values = tf.gather_nd(img, tf.stack([b, yi, xi], -1))
+        if not replicate:
+            inside = (x >= 0) & (x <= w-1) & (y >= 0) & (y <= h-1)
+            values *= tf.cast(inside, img.dtype)[..., None]
+        return values
+
+    top = (1-wx)*gather(x0, y0) + wx*gather(x0+1, y0)
+    bottom = (1-wx)*gather(x0, y0+1) + wx*gather(x0+1, y0+1)
+    return (1-wy)*top + wy*bottom
+
+
+def invertFlow(flow_rs, iters):
+    # remap maps (B, h, w, 2) by the fixed point iteration of
+    # rectifier.invertFlow
+    h, w = flow_rs.get_shape().as_list()[1:3]
+    indx = tf.range(w, dtype=tf.float32)[None, None, :]
+    indy = tf.range(h, dtype=tf.float32)[None, :, None]
+    map_x = indx + tf.zeros_like(flow_rs[:, :, :, 0])
+    map_y = indy + tf.zeros_like(flow_rs[:, :, :, 1])
+    for i in range(iters):
+        flow = sampleBilinear(flow_rs, map_x, map_y, replicate=True)
+        map_x, map_y = indx + flow[:, :, :, 0], indy + flow[:, :, :, 1]
+    return tf.stack([map_x, map_y], -1)
+
+
+def toGray(img):
+    # DepthNet takes the first channel, as in test.py
+    return img[:, :, :, 0:1]
+
+
+def warpImg(inputs):
+    img, maps = inputs
+    return sampleBilinear(img, maps[:, :, :, 0], maps[:, :, :, 1], replicate=False)
+
+
+def mapsToFlow(maps):
+    h, w = maps.get_shape().as_list()[1:3]
+    indx = tf.range(w, dtype=tf.float32)[None, None, :]
+    indy = tf.range(h, dtype=tf.float32)[None, :, None]
+    return tf.stack([maps[:, :, :, 0]-indx, maps[:, :, :, 1]-indy], -1)
+
+
+class ToGray(Layer):
+    def call(self, img):
+        return toGray(img)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[:3] + (1,)
+
+
+class FlowRS(Layer):
+    # cam and t_basis are plain lists to go into the saved config
+    def __init__(self, cam, t_basis, **kwargs):
+        super(FlowRS, self).__init__(**kwargs)
+        self.cam, self.t_basis = cam, t_basis
+
+    def call(self, inputs):
+        return getFlowRS(inputs, self.cam, self.t_basis)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[0][:3] + (2,)
+
+    def get_config(self):
+        config = super(FlowRS, self).get_config()
+        config.update({'cam': self.cam, 't_basis': self.t_basis})
+        return config
+
+
+class InvertFlow(Layer):
+    def __init__(self, iters, **kwargs):
+        super(InvertFlow, self).__init__(**kwargs)
+        self.iters = iters
+
+    def call(self, flow_rs):
+        return invertFlow(flow_rs, self.iters)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+    def get_config(self):
+        config = super(InvertFlow, self).get_config()
+        config.update({'iters': self.iters})
+        return config
+
+
+class WarpImg(Layer):
+    def call(self, inputs):
+        return warpImg(inputs)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape[0]
+
+
+class MapsToFlow(Layer):
+    def call(self, maps):
+        return mapsToFlow(maps)
+
+    def compute_output_shape(self, input_shape):
+        return input_shape
+
+
+class UnrollNet():
+    # DepthNet + AnchorNet + flow synthesis + warp in one model: an rgb frame
+    # in [0, 1] in, the rectified frame (and optionally the gs-to-rs flow) out
+    def __init__(self, im_shape, num_anchor, cam, iters=4, output_flow=False,
+                 width=1.0, separable=False, base='ResNet34'):
+        self.depthnet = DepthNet(im_shape, width=width, separable=separable)
+        self.anchornet = AnchorNet(
+            im_shape, num_anchor, base, width, separable)
+
+        _, t_basis, _, _ = rectifier.getSplineBasis(num_anchor, im_shape[0])
+        cam = [float(c) for c in cam[:4]]
+        t_basis = t_basis[:, 1:].tolist()
+
+        img = Input(shape=(im_shape[0], im_shape[1], 3))
+        img_gray = ToGray(name='gray')(img)
+        depth = self.depthnet.model(img_gray)
+        anchors = self.anchornet.model(img)
+        flow_rs = FlowRS(cam, t_basis, name='flow_rs')([depth, anchors])
+        maps = InvertFlow(iters, name='maps')(flow_rs)
+        img_rectified = WarpImg(name='rectified')([img, maps])
+        if output_flow:
+            flow = MapsToFlow(name='flow')(maps)
+            self.model = Model(inputs=img, outputs=[img_rectified, flow])
+        else:
+            self.model = Model(inputs=img, outputs=img_rectified)
+
+    def loadWeights(self, depth_ckpt, anchor_ckpt):
+        self.depthnet.model.load_weights(depth_ckpt)
+        self.anchornet.model.load_weights(anchor_ckpt)
+
+
+def loadUnrollNet(path):
+    # the model saved by export_unrollnet, its custom layers resolved here
+    return load_model(path, custom_objects={
+        layer.__name__: layer for layer in [ToGray, FlowRS, InvertFlow, WarpImg, MapsToFlow]})
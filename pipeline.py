@@ -0,0 +1,183 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import division, absolute_import
+import collections
+import queue
+import threading
+import time
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+
+def orderedMap(fn, tasks, pool=None, max_pending=1):
+    # apply fn to the tasks in a concurrent.futures pool, yielding results in
+    # task order; at most max_pending tasks are in flight, so the producer of
+    # tasks (e.g. network inference) runs at most that far ahead
+    if pool is None:
+        for task in tasks:
+            yield fn(task)
+        return
+
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, task))
+        if len(pending) >= max(max_pending, 1):
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class imgWriter():
+    # cv2.imwrite on background threads; at most max_pending images wait in
+    # memory, write() blocks beyond that
+    def __init__(self, num_threads=2, max_pending=16):
+        self.pool = ThreadPoolExecutor(num_threads)
+        self.pending = collections.deque()
+        self.max_pending = max_pending
+
+    def write(self, path, img):
+        self.pending.append(self.pool.submit(cv2.imwrite, path, img))
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft().result()
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().result()
+        self.pool.shutdown()
+
+
+class microBatcher():
+    # collects items submitted from many threads into batches of up to
+    # max_batch, waiting at most max_wait seconds after the first item, and
+    # runs fn(items) -> results on the thread calling run(), e.g. the one
+    # owning the TF graph
+    def __init__(self, fn, max_batch=8, max_wait=0.005):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batch_sizes = collections.Counter()
+
+    def submit(self, item):
+        # blocks until the batch holding item is done
+        slot = {'item': item, 'done': threading.Event()}
+        self.queue.put(slot)
+        slot['done'].wait()
+        if 'error' in slot:
+            raise slot['error']
+        return slot['result']
+
+    def runOnce(self, timeout=None):
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            wait = deadline - time.time()
+            try:
+                batch.append(self.queue.get(
+                    block=wait > 0, timeout=max(wait, 0) or None))
+            except queue.Empty:
+                break
+        self.batch_sizes[len(batch)] += 1
+
+        try:
+            results = self.fn([slot['item'] for slot in batch])
+            for slot, result in zip(batch, results):
+                slot['result'] = result
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0]['error'] = e
+            else:
+                # one at a time, so only the failing items get an error
+                for slot in batch:
+                    try:
+                        slot['result'] = self.fn([slot['item']])[0]
+                    except Exception as e_item:
+                        slot['error'] = e_item
+        for slot in batch:
+            slot['done'].set()
+
+    def run(self):
+        while True:
+            self.runOnce()
+
+
+class threadStage():
+    # fn applied in order on a background thread to the items put into a
+    # bounded queue, so put() blocks while the stage is behind; the results
+    # are put into next_stage, if any
+    def __init__(self, fn, next_stage=None, maxsize=4):
+        self.fn = fn
+        self.next_stage = next_stage
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # drain, the error is raised by put() or close()
+            try:
+                result = self.fn(item)
+                if self.next_stage is not None:
+                    self.next_stage.put(result)
+            except Exception as e:
+                self.error = e
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        # waits for every item to pass through this and the next stages
+        self.queue.put(None)
+        self.thread.join()
+        if self.next_stage is not None:
+            self.next_stage.close()
+        if self.error is not None:
+            raise self.error
+
+
+def prefetch(items, maxsize=4):
+    # iterates items (e.g. decoding frames) on a background thread, at most
+    # maxsize ahead of the consumer
+    buffer = queue.Queue(maxsize)
+    end = object()
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except Exception as e:
+            buffer.put(e)
+        buffer.put(end)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is end:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
@@ -15,20 +15,232 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import print_function, division
+import os
 import numpy as np
 import cv2
 from numpy import linalg as LA
 from scipy.spatial.transform import Rotation, RotationSpline
 from scipy.interpolate import CubicSpline
-import pandas as pd
+
+from backends import getKernel, projectRows
+
+
+# spline bases shared by every frame with the same (num_anchor, h)
+_spline_bases = {}
+# pixel index grids shared by every image with the same (h, w)
+_index_grids = {}
+
+
+# batched counterparts of the rotation vector kinematics of RotationSpline
+def skewBatch(x):
+    # (..., 3) vectors to (..., 3, 3) cross product matrices
+    zeros = np.zeros_like(x[..., 0])
+    return np.stack([np.stack([zeros, -x[..., 2], x[..., 1]], -1),
+                     np.stack([x[..., 2], zeros, -x[..., 0]], -1),
+                     np.stack([-x[..., 1], x[..., 0], zeros], -1)], -2)
+
+
+def rotvecCoeffs(norm, large, small):
+    # series expansion below 1e-4 rad, like RotationSpline
+    big = norm > 1e-4
+    nm = np.where(big, norm, 1.0)
+    return [np.where(big, f(nm), g(norm)) for f, g in zip(large, small)]
+
+
+def rateToRotvecDot(rotvecs):
+    # (..., 3, 3) matrices from angular rates to rotation vector derivatives
+    norm = LA.norm(rotvecs, axis=-1)
+    k, = rotvecCoeffs(norm, [lambda n: (1 - 0.5*n/np.tan(0.5*n)) / n**2],
+                      [lambda n: 1/12 + n**2/720])
+    skew = skewBatch(rotvecs)
+    return np.identity(3) + 0.5*skew + k[..., None, None]*np.matmul(skew, skew)
+
+
+def rotvecDotToRate(rotvecs):
+    # and back
+    norm = LA.norm(rotvecs, axis=-1)
+    k1, k2 = rotvecCoeffs(norm, [lambda n: (1 - np.cos(n)) / n**2,
+                                 lambda n: (n - np.sin(n)) / n**3],
+                          [lambda n: 0.5 - n**2/24, lambda n: 1/6 - n**2/120])
+    skew = skewBatch(rotvecs)
+    return np.identity(3) - k1[..., None, None]*skew + \
+        k2[..., None, None]*np.matmul(skew, skew)
+
+
+def accelerationTerm(rotvecs, rotvecs_dot):
+    # the part of the angular acceleration quadratic in rotvecs_dot
+    norm = LA.norm(rotvecs, axis=-1)
+    k1, k2, k3 = rotvecCoeffs(
+        norm, [lambda n: (-n*np.sin(n) - 2*(np.cos(n) - 1)) / n**4,
+               lambda n: (-2*n + 3*np.sin(n) - n*np.cos(n)) / n**5,
+               lambda n: (n - np.sin(n)) / n**3],
+        [lambda n: 1/12 - n**2/180, lambda n: -1/60 + n**2/12604,
+         lambda n: 1/6 - n**2/120])
+    dp = np.sum(rotvecs*rotvecs_dot, -1)[..., None]
+    cp = np.cross(rotvecs, rotvecs_dot)
+    return dp*(k1[..., None]*cp + k2[..., None]*np.cross(rotvecs, cp)) + \
+        k3[..., None]*np.cross(rotvecs_dot, cp)
 
 
 class rectifier:
-    def getGS2RSFlow(depth_rs, cam, anchors_t_r):
-        num_anchor = int(anchors_t_r.shape[0] / 6)
+    # bump whenever a change alters the synthesized flows, which invalidates
+    # cached evaluation results
+    version = 1
+
+    def getSplineBasis(num_anchor, h):
+        key = (num_anchor, h)
+        if key not in _spline_bases:
+            tm = np.arange(num_anchor+1) / num_anchor
+            tm_rows = np.arange(h) / (h-1)
+            # a cubic spline is linear in its knot values, so fitting it to
+            # the identity gives the (h, N+1) translation basis
+            t_basis = CubicSpline(tm, np.identity(num_anchor+1))(tm_rows)
+            # segment and local time powers of every row for the rotation
+            # spline, in the coefficient order of its piecewise polynomial
+            seg = np.searchsorted(tm, tm_rows, side='right') - 1
+            seg = np.clip(seg, 0, num_anchor-1)
+            dt = tm_rows - tm[seg]
+            dt_pows = np.stack([dt**3, dt**2, dt, np.ones_like(dt)], -1)
+            _spline_bases[key] = (tm, t_basis, seg, dt_pows)
+        return _spline_bases[key]
+
+    def fitRotationSplines(tm, rs):
+        # RotationSpline(tm, Rotation.from_rotvec(rs[b])).interpolator.c of a
+        # (B, N+1, 3) batch at once: the angular rates at the inner knots of
+        # every frame solve one dense block tridiagonal system, with the same
+        # fixed point iteration
+        batch, num_anchor = rs.shape[0], rs.shape[1]-1
+        dt = np.diff(tm)
+        rotvecs = (Rotation.from_rotvec(rs[:, :-1].reshape(-1, 3)).inv() *
+                   Rotation.from_rotvec(rs[:, 1:].reshape(-1, 3))).as_rotvec()
+        rotvecs = rotvecs.reshape(batch, num_anchor, 3)
+        rates = rotvecs / dt[:, None]
+        rotvecs_dot = rates
+        if num_anchor > 1:
+            A = rateToRotvecDot(rotvecs)
+            A_inv = rotvecDotToRate(rotvecs)
+            # (B, 3m, 3m) block tridiagonal: d*I on the diagonal, 2*A_inv/dt
+            # below and 2*A/dt above
+            m = num_anchor-1
+            M = np.zeros([batch, m, 3, m, 3])
+            idx = np.arange(m)
+            M[:, idx, :, idx, :] = (4*(1/dt[:-1]+1/dt[1:]))[:, None, None, None] * \
+                np.identity(3)
+            M[:, idx[1:], :, idx[:-1], :] = np.swapaxes(
+                2*A_inv[:, 1:-1]/dt[1:-1, None, None], 0, 1)
+            M[:, idx[:-1], :, idx[1:], :] = np.swapaxes(
+                2*A[:, 1:-1]/dt[1:-1, None, None], 0, 1)
+            M = M.reshape(batch, 3*m, 3*m)
+            rate_first = rates[:, 0].copy()
+            b0 = 6*(rotvecs[:, :-1]*dt[:-1, None]**-2 + rotvecs[:, 1:]*dt[1:, None]**-2)
+            b0[:, 0] -= 2/dt[0]*np.einsum('bij,bj->bi', A_inv[:, 0], rate_first)
+            b0[:, -1] -= 2/dt[-1]*np.einsum('bij,bj->bi', A[:, -1], rates[:, -1])
+            for i in range(10):
+                rotvecs_dot = np.einsum('bnij,bnj->bni', A, rates)
+                b = b0 - accelerationTerm(rotvecs[:, :-1], rotvecs_dot[:, :-1])
+                rates_new = LA.solve(M, b.reshape(batch, -1, 1)).reshape(batch, m, 3)
+                delta = np.abs(rates_new - rates[:, :-1])
+                rates[:, :-1] = rates_new
+                if np.all(delta < 1e-9*(1+np.abs(rates_new))):
+                    break
+            rotvecs_dot = np.einsum('bnij,bnj->bni', A, rates)
+            rates = np.concatenate([rate_first[:, None], rates[:, :-1]], 1)
+        dt = dt[:, None]
+        coeffs = np.empty([batch, 4, num_anchor, 3])
+        coeffs[:, 0] = (-2*rotvecs + dt*rates + dt*rotvecs_dot) / dt**3
+        coeffs[:, 1] = (3*rotvecs - 2*dt*rates - dt*rotvecs_dot) / dt**2
+        coeffs[:, 2] = rates
+        coeffs[:, 3] = 0
+        return coeffs
+
+    def getRowPosesBatch(cam, anchors_t_r, h):
+        batch = anchors_t_r.shape[0]
+        num_anchor = int(anchors_t_r.shape[1] / 6)
+        tm, t_basis, seg, dt_pows = rectifier.getSplineBasis(num_anchor, h)
+        ts = np.reshape(anchors_t_r[:, :(3*num_anchor)],
+                        (batch, num_anchor, 3))
+        rs = np.zeros([batch, num_anchor+1, 3])
+        rs[:, 1:] = np.reshape(anchors_t_r[:, (3*num_anchor):],
+                               (batch, num_anchor, 3))
+
+        # the first knot is the identity pose, so its basis column drops out
+        t_rows = np.matmul(t_basis[:, 1:], ts)
+
+        # the rotation splines of the batch are fitted together; the
+        # evaluation at every row is a lookup into the cached table
+        coeffs = rectifier.fitRotationSplines(tm, rs)
+        rotvecs = np.einsum('hk,bkhc->bhc', dt_pows, coeffs[:, :, seg])
+        R_rows = Rotation.from_rotvec(rs[:, seg].reshape(-1, 3)) * \
+            Rotation.from_rotvec(rotvecs.reshape(-1, 3))
+        R_rows = R_rows.as_matrix().reshape(batch, h, 3, 3)
+
+        K = np.array([[cam[0], 0, cam[2]], [0, cam[1], cam[3]], [0, 0, 1]])
+        K_i = LA.inv(K)
+
+        # KRK_i and Kt for every scan line, (B, h, 3, 3) and (B, h, 3)
+        KRK_i = np.matmul(np.matmul(K, R_rows), K_i)
+        Kt = np.matmul(t_rows, K.T)
+        return KRK_i, Kt
+
+    def getRowPoses(cam, anchors_t_r, h):
+        KRK_i, Kt = rectifier.getRowPosesBatch(
+            cam, np.expand_dims(anchors_t_r, 0), h)
+        return KRK_i[0], Kt[0]
+
+    def splatFlowBatch(depths_rs, KRK_i, Kt, backend=None):
+        return getKernel('splat_flow', backend)(depths_rs, KRK_i, Kt)
+
+    def splatFlow(depth_rs, KRK_i, Kt, backend=None):
+        return rectifier.splatFlowBatch(np.expand_dims(depth_rs, 0),
+                                        np.expand_dims(KRK_i, 0),
+                                        np.expand_dims(Kt, 0), backend)[0]
+
+    def getGS2RSFlowBatch(depths_rs, cam, anchors_t_r, backend=None):
+        h = depths_rs.shape[1]
+        KRK_i, Kt = rectifier.getRowPosesBatch(cam, anchors_t_r, h)
+        return rectifier.splatFlowBatch(depths_rs, KRK_i, Kt, backend)
+
+    def getGS2RSFlow(depth_rs, cam, anchors_t_r, backend=None):
+        h = depth_rs.shape[0]
+        KRK_i, Kt = rectifier.getRowPoses(cam, anchors_t_r, h)
+        return rectifier.splatFlow(depth_rs, KRK_i, Kt, backend)
+
+    def getPoints(depth_rs, cam):
+        # back-projected 3d points K_i*[u, v, 1]*depth of the valid pixels,
+        # which do not depend on the anchors
         h, w = depth_rs.shape[:2]
-        flow_gs2rs = np.empty([h, w, 2], dtype=np.float32)
-        flow_gs2rs[:] = np.nan
+        depth_rs = np.reshape(depth_rs, (h, w))
+        pixels = np.flatnonzero(~np.isnan(depth_rs)).astype(np.int32)
+        d = depth_rs.ravel()[pixels]
+        points = np.empty([pixels.shape[0], 3], dtype=np.float32)
+        points[:, 0] = (pixels % w - cam[2]) / cam[0] * d
+        points[:, 1] = (pixels // w - cam[3]) / cam[1] * d
+        points[:, 2] = d
+        return {'pixels': pixels, 'points': points, 'shape': np.array([h, w])}
+
+    def savePoints(path, points):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        np.savez(path, **points)
+
+    def loadPoints(path):
+        with np.load(path) as points:
+            return {key: points[key] for key in points.files}
+
+    def getGS2RSFlowByPoints(points, cam, anchors_t_r, backend=None):
+        # only the per-row poses and the projection are left per run
+        h = points['shape'][0]
+        KRK_i, Kt = rectifier.getRowPoses(cam, anchors_t_r, h)
+        K = np.array([[cam[0], 0, cam[2]], [0, cam[1], cam[3]], [0, 0, 1]])
+        KR = np.matmul(KRK_i, K)
+        return getKernel('splat_points', backend)(
+            points['pixels'], points['points'], KR, Kt, points['shape'])
+
+    def getGS2RSFlowLoop(depth_rs, cam, anchors_t_r):
+        # reference implementation of getGS2RSFlow, with a spline query per
+        # row and the per-pixel reference kernel
+        num_anchor = int(anchors_t_r.shape[0] / 6)
+        h = depth_rs.shape[0]
 
         tm = np.arange(num_anchor+1) / num_anchor
         ts, rs = [[0, 0, 0]], [[0, 0, 0]]
@@ -42,37 +254,230 @@ class rectifier:
         K = np.array([[cam[0], 0, cam[2]], [0, cam[1], cam[3]], [0, 0, 1]])
         K_i = LA.inv(K)
 
-        # Project from rs to gs
+        KRK_i, Kt = np.empty([h, 3, 3]), np.empty([h, 3])
         for v_rs in range(h):
             tm = v_rs/(h-1)
-            KRK_i = np.matmul(np.matmul(K, R_spline(tm).as_matrix()), K_i)
-            Kt = np.matmul(K, t_spline(tm))
-            for u_rs in range(w):
-                if np.isnan(depth_rs[v_rs, u_rs]):
-                    continue
-
-                p_gs = depth_rs[v_rs, u_rs] * \
-                    np.matmul(KRK_i, np.array([u_rs, v_rs, 1])) + Kt
-                u_gs, v_gs = p_gs[0] / p_gs[2], p_gs[1] / p_gs[2]
-                if not np.isnan(u_gs):
-                    u_gsi, v_gsi = int(u_gs+0.5), int(v_gs+0.5)
-                    if 0 <= u_gsi < w and 0 <= v_gsi < h:
-                        flow_gs2rs[v_gsi, u_gsi, 0] = u_rs-u_gs
-                        flow_gs2rs[v_gsi, u_gsi, 1] = v_rs-v_gs
-
-        return flow_gs2rs
+            KRK_i[v_rs] = np.matmul(
+                np.matmul(K, R_spline(tm).as_matrix()), K_i)
+            Kt[v_rs] = np.matmul(K, t_spline(tm))
 
-    def rectifyImgByFlow(img, flow):
-        h, w = img.shape[:2]
-        indy, indx = np.indices((h, w), dtype=np.float32)
-        flow_u = pd.DataFrame(flow[:, :, 0])
-        flow_v = pd.DataFrame(flow[:, :, 1])
-        flow_interp = np.empty_like(flow)
-        flow_interp[:, :, 0] = flow_u.interpolate(
-            method='linear', limit_direction='forward', axis=0)
-        flow_interp[:, :, 1] = flow_v.interpolate(
-            method='linear', limit_direction='forward', axis=0)
-        map_x = indx.reshape(h, w).astype(np.float32) + flow_interp[:, :, 0]
-        map_y = indy.reshape(h, w).astype(np.float32) + flow_interp[:, :, 1]
-        img_rectified = cv2.remap(img, map_x, map_y, cv2.INTER_LINEAR)
+        return rectifier.splatFlow(depth_rs, KRK_i, Kt, 'reference')
+
+    def getIndexGrid(h, w):
+        if (h, w) not in _index_grids:
+            indy, indx = np.indices((h, w), dtype=np.float32)
+            _index_grids[(h, w)] = (indy, indx)
+        return _index_grids[(h, w)]
+
+    def fillHoles(flow):
+        # linear interpolation of nan holes along each column, like pandas'
+        # interpolate(method='linear', limit_direction='forward', axis=0):
+        # leading holes stay nan, trailing holes take the last valid value
+        h = flow.shape[0]
+        values = flow.reshape(h, -1).astype(np.float64)
+        valid = ~np.isnan(values)
+        rows = np.arange(h)[:, None]
+        prv = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+        nxt = np.minimum.accumulate(
+            np.where(valid, rows, h)[::-1], axis=0)[::-1]
+        cols = np.arange(values.shape[1])
+        y0 = values[np.maximum(prv, 0), cols]
+        y1 = values[np.minimum(nxt, h-1), cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (y1-y0) / (nxt-prv)
+        filled = np.where(nxt < h, y0 + slope*(rows-prv), y0)
+        filled[valid] = values[valid]
+        filled[prv < 0] = np.nan
+        return filled.reshape(flow.shape).astype(flow.dtype)
+
+    def toFixedPoint(maps):
+        # CV_16SC2 + CV_16UC1 maps: faster to remap and half the memory;
+        # nan (unknown) pixels are sent outside the image
+        map_x = np.where(np.isnan(maps[0]), -1, maps[0]).astype(np.float32)
+        map_y = np.where(np.isnan(maps[1]), -1, maps[1]).astype(np.float32)
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def getMapsByFlow(flow, fixed_point=False):
+        h, w = flow.shape[:2]
+        indy, indx = rectifier.getIndexGrid(h, w)
+        flow_interp = rectifier.fillHoles(flow)
+        map_x = indx + flow_interp[:, :, 0]
+        map_y = indy + flow_interp[:, :, 1]
+        if fixed_point:
+            return rectifier.toFixedPoint((map_x, map_y))
+        return map_x, map_y
+
+    def invertFlow(flow_rs, iters=4, fixed_point=False):
+        # dense remap maps from the flow x_rs - x_gs known on the rs grid:
+        # find for every gs pixel x_gs the rs pixel x_rs projecting onto it
+        # by the fixed point iteration x_rs <- x_gs + flow(x_rs)
+        h, w = flow_rs.shape[:2]
+        indy, indx = rectifier.getIndexGrid(h, w)
+        map_x, map_y = indx, indy
+        for i in range(iters):
+            flow = cv2.remap(flow_rs, map_x, map_y, cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_REPLICATE)
+            map_x, map_y = indx + flow[:, :, 0], indy + flow[:, :, 1]
+        if fixed_point:
+            return rectifier.toFixedPoint((map_x, map_y))
+        return map_x, map_y
+
+    def getFlowByMaps(maps):
+        # dense gs-to-rs flow of float remap maps
+        indy, indx = rectifier.getIndexGrid(*maps[0].shape)
+        return np.stack([maps[0]-indx, maps[1]-indy], -1)
+
+    def getMapsByDepth(depth_rs, cam, anchors_t_r, iters=4, fixed_point=False):
+        # dense remap maps straight from depth and anchors, without the
+        # forward splat and the hole interpolation
+        h, w = depth_rs.shape[:2]
+        depth_rs = np.reshape(depth_rs, (h, w))
+        if np.any(np.isnan(depth_rs)):
+            depth_rs = rectifier.fillHoles(depth_rs)
+            depth_rs = rectifier.fillHoles(depth_rs[::-1])[::-1]
+        KRK_i, Kt = rectifier.getRowPoses(cam, anchors_t_r, h)
+        u_gs, v_gs = projectRows(np.expand_dims(depth_rs, 0),
+                                 np.expand_dims(KRK_i, 0),
+                                 np.expand_dims(Kt, 0))
+
+        indy, indx = rectifier.getIndexGrid(h, w)
+        flow_rs = np.empty([h, w, 2], dtype=np.float32)
+        flow_rs[:, :, 0] = indx - u_gs[0]
+        flow_rs[:, :, 1] = indy - v_gs[0]
+        flow_rs[~np.isfinite(flow_rs)] = 0
+        return rectifier.invertFlow(flow_rs, iters, fixed_point)
+
+    def getFramePose(anchors_t_r, ratio=1.0):
+        # motion (R, t) from the first row of a frame to the first row of the
+        # next one, P_next = R*P + t, extrapolated from the last anchor (the
+        # motion over the readout) by ratio = frame period / readout time
+        num_anchor = int(anchors_t_r.shape[0] / 6)
+        t_last = anchors_t_r[(3*num_anchor-3):(3*num_anchor)] * ratio
+        r_last = anchors_t_r[(6*num_anchor-3):] * ratio
+        R_i = Rotation.from_rotvec(r_last).as_matrix().T
+        return R_i, -np.matmul(R_i, t_last)
+
+    def warpDepth(depth, cam, R, t):
+        # depth of a frame seen from the camera moved by P' = R*P + t; the
+        # nearest point wins, holes are interpolated like in getMapsByDepth
+        # and what is left keeps the old depth
+        h, w = depth.shape[:2]
+        d = np.reshape(depth, (h, w)).astype(np.float64)
+        indy, indx = rectifier.getIndexGrid(h, w)
+        points = np.stack([(indx-cam[2])/cam[0]*d,
+                           (indy-cam[3])/cam[1]*d, d], -1)
+        points = np.matmul(points, np.transpose(R)) + t
+        z = points[:, :, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = np.trunc(cam[0]*points[:, :, 0]/z + cam[2] + 0.5)
+            v = np.trunc(cam[1]*points[:, :, 1]/z + cam[3] + 0.5)
+            valid = (z > 0) & (0 <= u) & (u < w) & (0 <= v) & (v < h)
+        dst = (v[valid]*w + u[valid]).astype(np.intp)
+        z = z[valid]
+        order = np.lexsort((-z, dst))  # per pixel, the nearest goes last
+        keep = order[np.append(dst[order][1:] != dst[order][:-1], True)]
+
+        warped = np.full(h*w, np.nan)
+        warped[dst[keep]] = z[keep]
+        warped = np.reshape(warped, (h, w))
+        warped = rectifier.fillHoles(warped)
+        warped = rectifier.fillHoles(warped[::-1])[::-1]
+        warped = np.where(np.isnan(warped), d, warped)
+        return np.reshape(warped, depth.shape).astype(depth.dtype)
+
+    def isRotationOnly(anchors_t_r, thres):
+        # whether the predicted translation of every anchor is below thres
+        num_anchor = int(anchors_t_r.shape[0] / 6)
+        ts = np.reshape(anchors_t_r[:(3*num_anchor)], (num_anchor, 3))
+        return np.max(LA.norm(ts, axis=-1)) < thres
+
+    def getMaxDisplacement(cam, anchors_t_r, shape, min_depth=1.0):
+        # cheap estimate (px) of the largest gs-to-rs displacement, from the
+        # anchors only: small angle rotation bound at the image corners plus
+        # the translation seen at min_depth (m)
+        h, w = shape[:2]
+        num_anchor = int(anchors_t_r.shape[0] / 6)
+        ts = np.reshape(anchors_t_r[:(3*num_anchor)], (num_anchor, 3))
+        rs = np.reshape(anchors_t_r[(3*num_anchor):], (num_anchor, 3))
+        f = max(cam[0], cam[1])
+        r_max = np.sqrt(max(cam[2], w-1-cam[2])**2 + max(cam[3], h-1-cam[3])**2)
+        return np.max(LA.norm(rs, axis=-1)*(f+r_max**2/f) +
+                      f*LA.norm(ts, axis=-1)/min_depth)
+
+    def getMapsByRotation(cam, anchors_t_r, shape, iters=4, fixed_point=False):
+        # rotation only: every row is warped by the homography K*R*K_i, so
+        # neither depth nor the translation anchors are needed
+        h, w = shape[:2]
+        num_anchor = int(anchors_t_r.shape[0] / 6)
+        anchors_r = np.zeros_like(anchors_t_r)
+        anchors_r[(3*num_anchor):] = anchors_t_r[(3*num_anchor):]
+        KRK_i, Kt = rectifier.getRowPoses(cam, anchors_r, h)
+        u_gs, v_gs = projectRows(np.ones([1, h, w]), np.expand_dims(KRK_i, 0),
+                                 np.expand_dims(Kt, 0))
+
+        indy, indx = rectifier.getIndexGrid(h, w)
+        flow_rs = np.empty([h, w, 2], dtype=np.float32)
+        flow_rs[:, :, 0] = indx - u_gs[0]
+        flow_rs[:, :, 1] = indy - v_gs[0]
+        flow_rs[~np.isfinite(flow_rs)] = 0
+        return rectifier.invertFlow(flow_rs, iters, fixed_point)
+
+    def scaleCam(cam, scale_x, scale_y):
+        # intrinsics of the same camera at a resized resolution
+        cam_scaled = np.array(cam, dtype=np.float64)
+        cam_scaled[0] = cam[0]*scale_x
+        cam_scaled[1] = cam[1]*scale_y
+        cam_scaled[2] = (cam[2]+0.5)*scale_x - 0.5
+        cam_scaled[3] = (cam[3]+0.5)*scale_y - 0.5
+        return cam_scaled
+
+    def upsampleMaps(maps, shape, fixed_point=False):
+        # float remap maps computed at a low resolution to the resolution
+        # shape, e.g. the native one of the sensor
+        h, w = maps[0].shape[:2]
+        H, W = shape[:2]
+        scale_x, scale_y = W / w, H / h
+        map_x = cv2.resize(maps[0], (W, H), interpolation=cv2.INTER_LINEAR)
+        map_y = cv2.resize(maps[1], (W, H), interpolation=cv2.INTER_LINEAR)
+        map_x = (map_x+0.5)*scale_x - 0.5
+        map_y = (map_y+0.5)*scale_y - 0.5
+        if fixed_point:
+            return rectifier.toFixedPoint((map_x, map_y))
+        return map_x, map_y
+
+    def getNativeMaps(depth_rs, cam, anchors_t_r, shape, fixed_point=False):
+        # depth and cam at the network resolution, maps at resolution shape
+        maps = rectifier.getMapsByDepth(depth_rs, cam, anchors_t_r)
+        return rectifier.upsampleMaps(maps, shape, fixed_point)
+
+    def rectifyImgByMaps(img, maps):
+        # maps are either float (map_x, map_y) or fixed point from toFixedPoint
+        if img.ndim < 3 or img.shape[2] <= 4:
+            return cv2.remap(img, maps[0], maps[1], cv2.INTER_LINEAR)
+
+        # cv2.remap takes up to 4 channels (and 2 take a less accurate path)
+        img_rectified = np.empty_like(img)
+        c = 0
+        while c < img.shape[2]:
+            left = img.shape[2] - c
+            step = 1 if left == 2 else (3 if left == 6 else min(left, 4))
+            channels = cv2.remap(np.ascontiguousarray(img[:, :, c:c+step]),
+                                 maps[0], maps[1], cv2.INTER_LINEAR)
+            img_rectified[:, :, c:c+step] = np.reshape(
+                channels, channels.shape[:2]+(step,))
+            c += step
         return img_rectified
+
+    def rectifyImgsByMaps(imgs, maps):
+        # rectify a stack (N, h, w[, C]) of images sharing one motion estimate
+        imgs_rectified = np.empty_like(imgs)
+        for i in range(imgs.shape[0]):
+            imgs_rectified[i] = rectifier.rectifyImgByMaps(imgs[i], maps)
+        return imgs_rectified
+
+    def rectifyImgByFlow(img, flow):
+        return rectifier.rectifyImgByMaps(img, rectifier.getMapsByFlow(flow))
+
+    def rectifyImgByDepth(img, depth_rs, cam, anchors_t_r):
+        return rectifier.rectifyImgByMaps(
+            img, rectifier.getMapsByDepth(depth_rs, cam, anchors_t_r))
@@ -0,0 +1,179 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Rectify a video or an image directory with the trained models; decoding,
+# inference, maps + warp and encoding run as a streaming pipeline on their
+# own threads, so only a few batches of frames are in memory at a time
+
+from __future__ import print_function, division
+import argparse
+import os
+import re
+import numpy as np
+import cv2
+from tqdm import tqdm
+
+from pipeline import prefetch, threadStage
+from unroller import Unroller
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv')
+IMG_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict')
+parser.add_argument('--input', help='Video file or image directory', required=True)
+parser.add_argument('--output', help='Video file or image directory', required=True)
+parser.add_argument(
+    '--cam', help='fx,fy,cx,cy at the network resolution, or a camera.npy', required=True)
+parser.add_argument(
+    '--net_shape', help='Network resolution h,w', default='256,320')
+parser.add_argument(
+    '--batch_size', help='Frames per network forward pass', default=8)
+parser.add_argument(
+    '--rot_thres', help='Skip DepthNet and warp by rotation only if every translation anchor is below this (m), <0 to disable', default=-1)
+parser.add_argument(
+    '--fps', help='Frame rate of the output video, 0 to keep the input one', default=0)
+parser.add_argument(
+    '--motion_thres', help='Pass frames whose estimated displacement is below this (px) through unchanged, <0 to disable', default=-1)
+parser.add_argument(
+    '--key_interval', help='Run DepthNet at least every this many frames and reuse the warped depth in between, 0 to run it on every frame', default=0)
+parser.add_argument(
+    '--key_thres', help='Mean image difference to the keyframe forcing a new one', default=0.05)
+parser.add_argument(
+    '--frame_ratio', help='Frame period / readout time, to extrapolate the motion between frames', default=1.0)
+parser.add_argument(
+    '--depth_level', help='Exit the DepthNet decoder at this pyramid level: 1 full, 2 or 3 coarser and faster with the checkpoint of train_depth --aux_weight', default=1)
+parser.add_argument(
+    '--width', help='Width multiplier of the model variant', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether the model variant uses depthwise separable convolutions', default=0)
+parser.add_argument(
+    '--base', help='AnchorNet backbone of the model variant', default='ResNet34')
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+print('Number of anchors to predict: {}'.format(num_anchor))
+print('Input: {}'.format(args.input))
+print('Output: {}'.format(args.output))
+if args.cam.endswith('.npy'):
+    cam = np.load(args.cam)
+else:
+    cam = np.array([float(c) for c in args.cam.split(',')])
+print('Camera: {}'.format(cam[:4]))
+net_shape = tuple(int(s) for s in args.net_shape.split(','))
+batch_size = int(args.batch_size)
+print('Batch size: {}'.format(batch_size))
+rot_thres = float(args.rot_thres)
+motion_thres = float(args.motion_thres)
+key_interval = int(args.key_interval)
+print('Keyframe interval: {}'.format(key_interval))
+depth_level = int(args.depth_level)
+print('Depth level: {}'.format(depth_level))
+width = float(args.width)
+separable = True if int(args.separable) > 0 else False
+base = args.base
+print('Model variant: {}, width {}, separable {}'.format(base, width, separable))
+fps = float(args.fps)
+
+
+def naturalKey(name):
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', name)]
+
+
+# frame names and count of the input
+if os.path.isdir(args.input):
+    names = sorted([f for f in os.listdir(args.input)
+                    if f.lower().endswith(IMG_EXTS)], key=naturalKey)
+    total_count = len(names)
+    fps = fps if fps > 0 else 30
+else:
+    cap = cv2.VideoCapture(args.input)
+    total_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = fps if fps > 0 else (cap.get(cv2.CAP_PROP_FPS) or 30)
+    cap.release()
+
+
+def readFrames():
+    if os.path.isdir(args.input):
+        for name in names:
+            yield name, cv2.imread(os.path.join(args.input, name))
+    else:
+        cap = cv2.VideoCapture(args.input)
+        i = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield '{}.png'.format(i), frame
+            i += 1
+        cap.release()
+
+
+to_video = args.output.lower().endswith(VIDEO_EXTS)
+if not to_video and not os.path.exists(args.output):
+    os.makedirs(args.output)
+video_writer = None
+
+
+def writeFrames(batch):
+    global video_writer
+    for name, frame in zip(*batch):
+        if to_video:
+            if video_writer is None:
+                video_writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(
+                    *'mp4v'), fps, (frame.shape[1], frame.shape[0]))
+            video_writer.write(frame)
+        else:
+            cv2.imwrite(os.path.join(args.output, name), frame)
+
+
+unroller = Unroller(net_shape, cam, num_anchor,
+                    max_batch=batch_size, rot_thres=rot_thres, motion_thres=motion_thres,
+                    key_interval=key_interval, key_thres=float(args.key_thres),
+                    frame_ratio=float(args.frame_ratio), depth_level=depth_level,
+                    width=width, separable=separable, base=base)
+
+
+def rectifyFrames(batch):
+    names, frames, preds = batch
+    return names, unroller.rectifyPredicted(frames, *preds)
+
+
+# decode -> inference (this thread, owning the TF graph) -> maps + warp ->
+# encode
+encoder = threadStage(writeFrames)
+warper = threadStage(rectifyFrames, encoder)
+batch_names, batch_frames = [], []
+progress = tqdm(total=total_count)
+for name, frame in prefetch(readFrames(), 2*batch_size):
+    batch_names.append(name)
+    batch_frames.append(frame)
+    if len(batch_frames) == batch_size:
+        warper.put((batch_names, batch_frames, unroller.predict(batch_frames)))
+        progress.update(len(batch_frames))
+        batch_names, batch_frames = [], []
+if len(batch_frames) > 0:
+    warper.put((batch_names, batch_frames, unroller.predict(batch_frames)))
+    progress.update(len(batch_frames))
+warper.close()
+progress.close()
+if video_writer is not None:
+    video_writer.release()
+
+print('Skipped: {:.3f}'.format(unroller.getSkipRate()))
+if unroller.tracker is not None:
+    print('Keyframes: {:.3f}'.format(unroller.tracker.getKeyframeRate()))
+for stage, ms in unroller.getLatency().items():
+    print('{:<10} {:.2f} ms/frame'.format(stage, ms))
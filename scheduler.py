@@ -0,0 +1,116 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import division, absolute_import
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class streamScheduler():
+    # frames of several streams (e.g. the cameras of a rig) share one
+    # Unroller: every batch is filled round-robin over the streams with
+    # pending frames, starting from a rotating stream, so a busy stream only
+    # gets the slots the others leave free; every stream is served in frame
+    # order, and submit() blocks a stream with max_pending frames waiting
+    def __init__(self, unroller, cams, max_batch=None, max_wait=0.005, max_pending=8):
+        # the depth tracker assumes the frames of one sequence in order,
+        # batches interleaving several streams would mix their keyframes
+        if unroller.tracker is not None:
+            raise ValueError(
+                'streamScheduler needs an Unroller without key_interval (depth reuse)')
+        self.unroller = unroller
+        self.cams = cams
+        # predict() takes up to unroller.max_batch frames
+        self.max_batch = unroller.max_batch if max_batch is None else min(
+            max_batch, unroller.max_batch)
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.queues = [collections.deque() for cam in cams]
+        self.cond = threading.Condition()
+        self.next_stream = 0
+        self.closed = False
+        self.served = [0]*len(cams)
+        self.batch_sizes = collections.Counter()
+
+    def numPending(self):
+        return sum(len(q) for q in self.queues)
+
+    def submit(self, stream, frame):
+        # future of the rectified frame
+        future = Future()
+        with self.cond:
+            while len(self.queues[stream]) >= self.max_pending:
+                self.cond.wait()
+            self.queues[stream].append((frame, future))
+            self.cond.notify_all()
+        return future
+
+    def close(self):
+        # run() returns once every submitted frame is done
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def takeBatch(self):
+        # round-robin over the streams, called with the lock held
+        batch = []
+        num_streams = len(self.queues)
+        while len(batch) < self.max_batch and self.numPending() > 0:
+            for k in range(num_streams):
+                stream = (self.next_stream + k) % num_streams
+                if len(self.queues[stream]) > 0 and len(batch) < self.max_batch:
+                    batch.append((stream,) + self.queues[stream].popleft())
+        self.next_stream = (self.next_stream + 1) % num_streams
+        self.cond.notify_all()
+        return batch
+
+    def runOnce(self):
+        # forms and runs one batch, False once closed and drained
+        with self.cond:
+            while self.numPending() == 0 and not self.closed:
+                self.cond.wait()
+            if self.numPending() == 0:
+                return False
+            deadline = time.time() + self.max_wait
+            while self.numPending() < self.max_batch and not self.closed:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    break
+                self.cond.wait(wait)
+            batch = self.takeBatch()
+        self.batch_sizes[len(batch)] += 1
+
+        frames = [frame for stream, frame, future in batch]
+        cams = [self.cams[stream] for stream, frame, future in batch]
+        try:
+            preds = self.unroller.predict(frames, cams)
+            frames_rectified = self.unroller.rectifyPredicted(
+                frames, *preds, cams=cams)
+        except Exception as e:
+            for stream, frame, future in batch:
+                future.set_exception(e)
+            return True
+        for (stream, frame, future), frame_rectified in zip(batch, frames_rectified):
+            self.served[stream] += 1
+            future.set_result(frame_rectified)
+        return True
+
+    def run(self):
+        # on the thread owning the TF graph
+        while self.runOnce():
+            pass
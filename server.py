@@ -0,0 +1,162 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Local rectification service: one Unroller shared by every client on the
+# host; concurrent requests are micro-batched, frames and results travel
+# through memory mapped files owned by the client (see client.py)
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import numpy as np
+
+from client import DEFAULT_ADDRESS, isBufferPath
+from data_loader import dataLoader
+from pipeline import microBatcher
+from unroller import Unroller
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--anchor', help='Number of anchors to predict')
+parser.add_argument('--socket', help='Unix socket to listen on',
+                    default=DEFAULT_ADDRESS)
+parser.add_argument(
+    '--max_batch', help='Most requests per network forward pass', default=8)
+parser.add_argument(
+    '--max_wait', help='Longest wait (ms) for a batch to fill up', default=5)
+parser.add_argument(
+    '--rot_thres', help='Skip DepthNet and warp by rotation only if every translation anchor is below this (m), <0 to disable', default=-1)
+parser.add_argument(
+    '--motion_thres', help='Pass frames whose estimated displacement is below this (px) through unchanged, <0 to disable', default=-1)
+parser.add_argument(
+    '--depth_level', help='Exit the DepthNet decoder at this pyramid level: 1 full, 2 or 3 coarser and faster with the checkpoint of train_depth --aux_weight', default=1)
+parser.add_argument(
+    '--width', help='Width multiplier of the model variant', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether the model variant uses depthwise separable convolutions', default=0)
+parser.add_argument(
+    '--base', help='AnchorNet backbone of the model variant', default='ResNet34')
+args = parser.parse_args()
+num_anchor = int(args.anchor)
+print('Number of anchors to predict: {}'.format(num_anchor))
+address = args.socket
+print('Socket: {}'.format(address))
+max_batch = int(args.max_batch)
+print('Max batch: {}'.format(max_batch))
+max_wait = float(args.max_wait)
+print('Max wait: {} ms'.format(max_wait))
+rot_thres = float(args.rot_thres)
+motion_thres = float(args.motion_thres)
+print('Rotation only threshold: {}'.format(rot_thres))
+print('Motion threshold: {}'.format(motion_thres))
+depth_level = int(args.depth_level)
+print('Depth level: {}'.format(depth_level))
+width = float(args.width)
+separable = True if int(args.separable) > 0 else False
+base = args.base
+print('Model variant: {}, width {}, separable {}'.format(base, width, separable))
+
+data_loader = dataLoader()
+unroller = Unroller(data_loader.getImgShape(), data_loader.cam, num_anchor,
+                    max_batch=max_batch, rot_thres=rot_thres, motion_thres=motion_thres,
+                    depth_level=depth_level, width=width, separable=separable, base=base)
+
+
+def runBatch(items):
+    # (op, frame) items to rectified frames or flows, one batch per op
+    results = [None]*len(items)
+    for op, fn in [('rectify', unroller.rectifyBatch), ('flow', unroller.predictFlowBatch)]:
+        idx = [i for i, item in enumerate(items) if item[0] == op]
+        if len(idx) > 0:
+            outputs = fn([items[i][1] for i in idx])
+            for i, output in zip(idx, outputs):
+                results[i] = output
+    return results
+
+
+batcher = microBatcher(runBatch, max_batch, max_wait/1000)
+
+
+class requestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.bufs = {}
+        for line in self.rfile:
+            try:
+                reply = self.serve(json.loads(line.decode()))
+            except Exception as e:
+                reply = {'error': repr(e)}
+            self.wfile.write((json.dumps(reply)+'\n').encode())
+            self.wfile.flush()
+        self.bufs = {}  # unmapped once collected
+
+    def getBuffer(self, key, path):
+        # a client maps a new file whenever its payload outgrows the old one
+        if key not in self.bufs or self.bufs[key].filename != path:
+            if not isBufferPath(path):
+                raise ValueError('Not a client buffer: {}'.format(path))
+            self.bufs[key] = np.memmap(path, np.uint8, 'r+')
+        return self.bufs[key]
+
+    def serve(self, msg):
+        if msg['op'] == 'info':
+            return {'im_shape': list(unroller.im_shape)}
+        if msg['op'] not in ['rectify', 'flow']:
+            raise ValueError('Unknown op {}'.format(msg['op']))
+
+        # checked here, a bad request must not fail the batch it would join
+        shape = msg['shape']
+        if len(shape) != 3 or shape[2] != 3 or \
+                not all(isinstance(n, int) and n > 0 for n in shape):
+            raise ValueError('Frames must be (h, w, 3), got {}'.format(shape))
+        buf_in, buf_out = self.getBuffer('in', msg['in']), self.getBuffer('out', msg['out'])
+        in_bytes = shape[0]*shape[1]*3
+        if msg['op'] == 'rectify':
+            out_bytes = in_bytes
+        else:
+            out_bytes = unroller.im_shape[0]*unroller.im_shape[1]*2*4
+        if buf_in.size < in_bytes or buf_out.size < out_bytes:
+            raise ValueError('Buffers too small for a {} frame'.format(shape))
+
+        # the frame is read in place, the client waits for the reply
+        frame = buf_in[:in_bytes].reshape(shape)
+        result = batcher.submit((msg['op'], frame))
+        buf_out[:result.nbytes].view(result.dtype).reshape(result.shape)[:] = result
+        return {'shape': list(result.shape), 'dtype': str(result.dtype)}
+
+
+if os.path.exists(address):
+    os.remove(address)
+server = socketserver.ThreadingUnixStreamServer(address, requestHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+print('Listening on {}'.format(address))
+
+# the networks run on the main thread, which owns the TF graph; stop on
+# ctrl-c or SIGTERM
+signal.signal(signal.SIGTERM, signal.default_int_handler)
+try:
+    batcher.run()
+except KeyboardInterrupt:
+    server.shutdown()
+    server.server_close()
+    os.remove(address)
+    print('Batch sizes: {}'.format(dict(sorted(batcher.batch_sizes.items()))))
+    print('Skipped: {:.3f}'.format(unroller.getSkipRate()))
+    for stage, ms in unroller.getLatency().items():
+        print('{:<10} {:.2f} ms/frame'.format(stage, ms))
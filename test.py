@@ -16,92 +16,297 @@
 
 from __future__ import print_function, division
 import argparse
+import multiprocessing
 import os
-import cv2
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import heapq
 from tqdm import tqdm
 
+import backends
 from data_loader import dataLoader
 from rectifier import rectifier
-
-from model.depthnet import DepthNet
-from model.anchornet import AnchorNet
+from evaluation import evaluateBatch, resultCache
+from pipeline import orderedMap, imgWriter
 
 # read num_anchor from command line
 parser = argparse.ArgumentParser()
-parser.add_argument('--anchor', help='Number of anchors to predict')
+parser.add_argument(
+    '--anchor', help='Number of anchors to predict, or a comma separated list to evaluate in one pass')
 parser.add_argument(
     '--rectify_img', help='Whether to rectify images', default=0)
+parser.add_argument(
+    '--direct_maps', help='Rectify by remap maps computed directly from depth', default=0)
+parser.add_argument(
+    '--rot_thres', help='Skip DepthNet and warp by rotation only if every translation anchor is below this (m), <0 to disable', default=-1)
+parser.add_argument(
+    '--batch_size', help='Frames per network forward pass', default=1)
+parser.add_argument(
+    '--workers', help='Flow synthesis processes running alongside the networks, 0 to run inline', default=0)
+parser.add_argument(
+    '--stream_imgs', help='Write each rectified image as it is produced, with a ranking file', default=0)
+parser.add_argument(
+    '--top_k', help='Only keep the K most intensive rectified images, 0 to keep all', default=0)
+parser.add_argument(
+    '--cache', help='Only evaluate frames without cached results for the same checkpoints; '
+    'results are keyed by frame index, delete test_results/*/cache/ after regenerating the data', default=0)
+parser.add_argument(
+    '--motion_thres', help='Leave frames whose displacement estimated from the anchors is below this (px) as they are, <0 to disable', default=-1)
+parser.add_argument(
+    '--seq', help='Evaluate the consecutive frames of the test sequence instead of the testing split', default=0)
+parser.add_argument(
+    '--key_interval', help='Run DepthNet at least every this many frames and reuse the warped depth in between (needs --seq), 0 to run it on every frame', default=0)
+parser.add_argument(
+    '--key_thres', help='Mean image difference to the keyframe forcing a new one', default=0.05)
+parser.add_argument(
+    '--frame_ratio', help='Frame period / readout time, to extrapolate the motion between frames', default=1.0)
+parser.add_argument(
+    '--depth_level', help='Exit the DepthNet decoder at this pyramid level: 1 full, 2 or 3 coarser and faster with the checkpoint of train_depth --aux_weight', default=1)
+parser.add_argument(
+    '--width', help='Width multiplier of the model variant', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether the model variant uses depthwise separable convolutions', default=0)
+parser.add_argument(
+    '--base', help='AnchorNet backbone of the model variant', default='ResNet34')
 args = parser.parse_args()
-num_anchor = int(args.anchor)
-print('Number of anchors to predict: {}'.format(num_anchor))
+num_anchors = [int(a) for a in str(args.anchor).split(',')]
+print('Number of anchors to predict: {}'.format(
+    ', '.join(str(n) for n in num_anchors)))
 rectify_img = True if int(args.rectify_img) > 0 else False
 print('Rectify image: {}'.format(rectify_img))
+direct_maps = True if int(args.direct_maps) > 0 else False
+print('Direct maps: {}'.format(direct_maps))
+rot_thres = float(args.rot_thres)
+print('Rotation only threshold: {}'.format(rot_thres))
+motion_thres = float(args.motion_thres)
+print('Motion threshold: {}'.format(motion_thres))
+depth_level = int(args.depth_level)
+print('Depth level: {}'.format(depth_level))
+width = float(args.width)
+separable = True if int(args.separable) > 0 else False
+base = args.base
+print('Model variant: {}, width {}, separable {}'.format(base, width, separable))
+use_seq = True if int(args.seq) > 0 else False
+print('Test sequence: {}'.format(use_seq))
+key_interval = int(args.key_interval)
+key_thres = float(args.key_thres)
+frame_ratio = float(args.frame_ratio)
+print('Keyframe interval: {}'.format(key_interval))
+if key_interval > 0 and (len(num_anchors) != 1 or num_anchors[0] == 0):
+    raise ValueError('Depth reuse needs exactly one anchor count > 0')
+if key_interval > 0 and not use_seq:
+    raise ValueError('Depth reuse needs the consecutive frames of --seq')
+batch_size = int(args.batch_size)
+print('Batch size: {}'.format(batch_size))
+num_workers = int(args.workers)
+print('Workers: {}'.format(num_workers))
+stream_imgs = True if int(args.stream_imgs) > 0 else False
+print('Stream images: {}'.format(stream_imgs))
+top_k = int(args.top_k)
+print('Top K images: {}'.format(top_k))
+use_cache = True if int(args.cache) > 0 else False
+print('Use cache: {}'.format(use_cache))
+
+# flow synthesis workers, one thread each as the pool covers the cores;
+# the pool must exist before TF is imported below, forking a process with
+# TF initialised is unsafe, and 'fork' keeps that on every platform
+pool = ProcessPoolExecutor(
+    num_workers, mp_context=multiprocessing.get_context('fork'),
+    initializer=partial(backends.setNumThreads, 1)) if num_workers > 0 else None
+if pool is not None:
+    # workers are only forked on first use, start all of them now
+    list(pool.map(abs, range(num_workers)))
+
+from unroller import depthTracker
+from model.depthnet import DepthNet
+from model.anchornet import AnchorNet
+from model.layers import getVariantSuffix
 
 # load data
 data_loader = dataLoader()
-imgs = data_loader.loadTestingImg()
-flows = data_loader.loadTestingFlow()
+if use_seq:
+    imgs = data_loader.loadSeqImg()
+    flows = data_loader.loadSeqFlow()
+    imgs_gt = data_loader.loadSeqRectifiedGT() if rectify_img else None
+    eval_idx = data_loader.seq_idx
+else:
+    imgs = data_loader.loadTestingImg()
+    flows = data_loader.loadTestingFlow()
+    imgs_gt = data_loader.loadTestingRectifiedGT() if rectify_img else None
+    eval_idx = data_loader.test_idx
 total_count = len(imgs)
 
-# load model
-if num_anchor > 0:
-    depthnet = DepthNet(data_loader.getImgShape())
-    depthnet.model.load_weights(os.path.join(
-        os.getcwd(), "checkpoints/model_depth.hdf5"))
-    anchornet = AnchorNet(data_loader.getImgShape(), num_anchor)
-    anchornet.model.load_weights(os.path.join(os.getcwd(
-    ), 'checkpoints/model_anchor{}.hdf5'.format(num_anchor)))
-
 # path to save results
-save_path = os.path.join(os.getcwd(), "test_results/test/")
+save_path = os.path.join(
+    os.getcwd(), "test_results/seq/" if use_seq else "test_results/test/")
 if not os.path.exists(save_path):
     os.makedirs(save_path)
-img_path = save_path+'images/'
-if rectify_img and not os.path.exists(img_path):
-    os.makedirs(img_path)
-
-wins = 0
-input_errs = []
-errs = []
-imgs_res = []
-rs_intense = []
-for i in tqdm(range(total_count)):
-    img_input_rgb = np.expand_dims(imgs[i], 0)  # (1, h, w, 3)
-    img_input = np.expand_dims(img_input_rgb[:, :, :, 0], -1)  # (1, h, w, 1)
-    flow_gt = flows[i]
-
-    if num_anchor > 0:
-        depth_pred = depthnet.model.predict(img_input)[0]
-        anchor_pred = anchornet.model.predict(img_input_rgb)[0]
-        flow_pred = rectifier.getGS2RSFlow(
-            depth_pred, data_loader.cam, anchor_pred)
-    else:
-        flow_pred = np.zeros_like(flow_gt)
-
-    pred_dist = np.nanmean(
-        np.sqrt(np.sum(np.square(flow_gt-flow_pred), axis=-1)))
-    zero_dist = np.nanmean(np.sqrt(np.sum(np.square(flow_gt), axis=-1)))
-    input_errs.append(zero_dist)
-    errs.append(pred_dist)
-    wins += (1 if zero_dist > pred_dist else 0)
+img_paths = {}
+for num_anchor in num_anchors:
+    img_paths[num_anchor] = save_path + \
+        ('images/' if len(num_anchors) == 1 else 'images{}/'.format(num_anchor))
+    if rectify_img and not os.path.exists(img_paths[num_anchor]):
+        os.makedirs(img_paths[num_anchor])
+
+# cached results are keyed by the dataset index of the frame; rectified
+# images and depth reuse need every frame evaluated
+frame_ids = eval_idx[::data_loader.step]
+depth_ckpt = os.path.join(os.getcwd(), 'checkpoints/model_depth{}.hdf5'.format(
+    getVariantSuffix(width, separable, multi_scale=depth_level > 1)))
+anchor_ckpts = {num_anchor: os.path.join(os.getcwd(), 'checkpoints/model_anchor{}{}.hdf5'.format(
+    num_anchor, getVariantSuffix(width, separable, base))) for num_anchor in num_anchors}
+caches = {}
+eval_mask = np.ones(total_count, dtype=bool)
+if use_cache and not rectify_img and key_interval == 0:
+    eval_mask[:] = False
+    for num_anchor in num_anchors:
+        ckpt_paths = [] if num_anchor == 0 else [
+            depth_ckpt, anchor_ckpts[num_anchor]]
+        caches[num_anchor] = resultCache(
+            save_path+'cache/', num_anchor, ckpt_paths, [rot_thres, motion_thres, depth_level])
+        eval_mask |= caches[num_anchor].missing(frame_ids)
+eval_pos = np.flatnonzero(eval_mask)
+print('Frames to evaluate: {}'.format(eval_pos.shape[0]))
+
+# load models, one DepthNet shared by every AnchorNet
+anchornets = {}
+for num_anchor in num_anchors:
+    if num_anchor > 0 and eval_pos.shape[0] > 0:
+        anchornets[num_anchor] = AnchorNet(
+            data_loader.getImgShape(), num_anchor, base, width, separable)
+        anchornets[num_anchor].model.load_weights(anchor_ckpts[num_anchor])
+if len(anchornets) > 0:
+    depthnet = DepthNet(data_loader.getImgShape(),
+                        depth_level, width, separable)
+    depthnet.loadWeights(depth_ckpt)
+tracker = None
+if key_interval > 0:
+    tracker = depthTracker(data_loader.cam, key_interval,
+                           key_thres, frame_ratio)
+
+
+def predictBatches():
+    # network forward passes, feeding the flow synthesis workers with one
+    # task per anchor count; the depth of a batch is predicted once
+    for start in range(0, eval_pos.shape[0], batch_size):
+        pos = eval_pos[start:start+batch_size]
+        img_input_rgb = imgs[pos]  # (b, h, w, 3)
+        img_input = img_input_rgb[:, :, :, 0:1]  # (b, h, w, 1)
+        anchor_preds, rot_onlys, skips = {}, {}, {}
+        need_depth = np.zeros(pos.shape[0], dtype=bool)
+        for num_anchor in num_anchors:
+            rot_onlys[num_anchor] = np.zeros(pos.shape[0], dtype=bool)
+            skips[num_anchor] = np.zeros(pos.shape[0], dtype=bool)
+            anchor_preds[num_anchor] = None
+            if num_anchor > 0:
+                anchor_preds[num_anchor] = anchornets[num_anchor].model.predict(
+                    img_input_rgb, batch_size=batch_size)
+                if motion_thres >= 0:
+                    skips[num_anchor] = np.array([rectifier.getMaxDisplacement(
+                        data_loader.cam, anchor, img_input.shape[1:3]) < motion_thres
+                        for anchor in anchor_preds[num_anchor]])
+                rot_onlys[num_anchor] = np.array([rectifier.isRotationOnly(
+                    anchor, rot_thres) for anchor in anchor_preds[num_anchor]]) & ~skips[num_anchor]
+                need_depth |= ~rot_onlys[num_anchor] & ~skips[num_anchor]
+        depth_pred = None
+        if len(anchornets) > 0:
+            if tracker is not None:
+                key = tracker.selectKeyframes(img_input_rgb)
+                depth_idx = np.flatnonzero(key)
+            else:
+                depth_idx = np.flatnonzero(need_depth)
+            depth_pred = np.empty(img_input.shape, dtype=np.float32)
+            if depth_idx.shape[0] > 0:
+                depth_pred[depth_idx] = depthnet.model.predict(
+                    img_input[depth_idx], batch_size=batch_size)
+            if tracker is not None:
+                tracker.fillDepths(depth_pred, key,
+                                   anchor_preds[num_anchors[0]])
+        for num_anchor in num_anchors:
+            yield (img_input_rgb, flows[pos], anchor_preds[num_anchor],
+                   depth_pred, rot_onlys[num_anchor], skips[num_anchor],
+                   None if imgs_gt is None else imgs_gt[pos])
+
+
+results = {}
+for num_anchor in num_anchors:
+    results[num_anchor] = {'input_errs': [], 'errs': [], 'rot_only': [],
+                           'skipped': [], 'imgs_res': [], 'rs_intense': []}
+evaluate = partial(evaluateBatch, cam=data_loader.cam,
+                   direct_maps=direct_maps, rectify_img=rectify_img)
+writer = imgWriter() if rectify_img else None
+num_tasks = (eval_pos.shape[0]+batch_size-1)//batch_size*len(num_anchors)
+for ti, res in enumerate(tqdm(orderedMap(evaluate, predictBatches(), pool, 2*num_workers),
+                              total=num_tasks)):
+    num_anchor = num_anchors[ti % len(num_anchors)]
+    result, img_path = results[num_anchor], img_paths[num_anchor]
+    imgs_res, rs_intense = result['imgs_res'], result['rs_intense']
+    for img_res, intense in zip(res['imgs_res'], res['zero_dist']):
+        if stream_imgs:
+            writer.write(img_path+'frame{}.png'.format(len(rs_intense)), img_res)
+        elif top_k > 0:
+            # min-heap of the top_k most intensive so far
+            item = (intense, len(rs_intense), img_res)
+            if len(imgs_res) < top_k:
+                heapq.heappush(imgs_res, item)
+            else:
+                heapq.heappushpop(imgs_res, item)
+        else:
+            imgs_res.append(img_res)
+        rs_intense.append(intense)
+    result['input_errs'].extend(res['zero_dist'])
+    result['errs'].extend(res['pred_dist'])
+    result['rot_only'].extend(res['rot_only'])
+    result['skipped'].extend(res['skipped'])
+    if num_anchor in caches:
+        bi = ti // len(num_anchors)
+        caches[num_anchor].update(
+            frame_ids[eval_pos[bi*batch_size:(bi+1)*batch_size]], res)
+if pool is not None:
+    pool.shutdown()
+
+for num_anchor in num_anchors:
+    result, img_path = results[num_anchor], img_paths[num_anchor]
+    input_errs, errs = result['input_errs'], result['errs']
+    rot_only, skipped = result['rot_only'], result['skipped']
+    if num_anchor in caches:
+        caches[num_anchor].save()
+        cached = caches[num_anchor].get(frame_ids)
+        input_errs, errs = cached['zero_dist'], cached['pred_dist']
+        rot_only, skipped = cached['rot_only'], cached['skipped']
+    wins = np.count_nonzero(np.array(input_errs) > np.array(errs))
+    if len(num_anchors) > 1:
+        print('Number of anchors: {}'.format(num_anchor))
+    print('Improved Ratio: {:.3f}'.format(wins/len(errs)))
+    print('Input EPE errs: {:.3f}'.format(np.mean(input_errs)))
+    print('EPE errs:       {:.3f}'.format(np.mean(errs)))
+    print('Rotation only:  {:.3f}'.format(
+        np.count_nonzero(rot_only)/len(errs)))
+    if motion_thres >= 0:
+        print('Skipped:        {:.3f}'.format(
+            np.count_nonzero(skipped)/len(errs)))
+    if tracker is not None:
+        print('Keyframes:      {:.3f}'.format(tracker.getKeyframeRate()))
+    np.save(save_path+'errs{}.npy'.format(num_anchor), np.array(errs))
 
     if rectify_img:
-        img_rgb = 255*img_input_rgb[0]
-        img_rectified = rectifier.rectifyImgByFlow(img_rgb, flow_pred)
-        img_rectified_gt = rectifier.rectifyImgByFlow(img_rgb, flow_gt)
-        img_res = cv2.hconcat([img_rgb, img_rectified, img_rectified_gt])
-        imgs_res.append(img_res)
-        rs_intense.append(zero_dist)
-
-print('Improved Ratio: {:.3f}'.format(wins/len(errs)))
-print('Input EPE errs: {:.3f}'.format(np.mean(input_errs)))
-print('EPE errs:       {:.3f}'.format(np.mean(errs)))
-np.save(save_path+'errs{}.npy'.format(num_anchor), np.array(errs))
-
-if rectify_img:
-    # intensive rs image goes first
-    rs_sorted_idx = np.argsort(rs_intense)
-    for i in range(total_count):
-        cv2.imwrite(img_path+'{}.png'.format(i),
-                    imgs_res[rs_sorted_idx[total_count-1-i]])
+        # intensive rs image goes first
+        imgs_res, rs_intense = result['imgs_res'], result['rs_intense']
+        rs_sorted_idx = np.argsort(rs_intense)
+        if stream_imgs:
+            # rank, file of the frame and its rs intensity
+            with open(img_path+'ranking.txt', 'w') as f:
+                for i in range(total_count):
+                    fi = rs_sorted_idx[total_count-1-i]
+                    f.write('{} frame{}.png {:.6f}\n'.format(
+                        i, fi, rs_intense[fi]))
+        elif top_k > 0:
+            for i, item in enumerate(sorted(imgs_res, key=lambda x: x[:2], reverse=True)):
+                writer.write(img_path+'{}.png'.format(i), item[2])
+        else:
+            for i in range(total_count):
+                writer.write(img_path+'{}.png'.format(i),
+                             imgs_res[rs_sorted_idx[total_count-1-i]])
+if writer is not None:
+    writer.close()
@@ -29,19 +29,31 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--anchor', help='Number of anchors to predict')
 parser.add_argument(
     '--rectify_img', help='Whether to rectify images', default=0)
+parser.add_argument(
+    '--batch_size', help='Frames per flow synthesis batch', default=16)
+parser.add_argument(
+    '--points', help='Whether to use the cached back-projected depth', default=0)
 args = parser.parse_args()
 num_anchor = int(args.anchor)
 print('Number of anchors: {}'.format(num_anchor))
 rectify_img = True if int(args.rectify_img) > 0 else False
 print('Rectify image: {}'.format(rectify_img))
+batch_size = int(args.batch_size)
+use_points = True if int(args.points) > 0 else False
+print('Use point cache: {}'.format(use_points))
 
 # load data
 data_loader = dataLoader()
 imgs = data_loader.loadSeqImg()
 flows = data_loader.loadSeqFlow()
-depths = data_loader.loadSeqDepth()
+if use_points:
+    points = data_loader.loadSeqPoints()
+else:
+    depths = data_loader.loadSeqDepth()
 anchors = data_loader.loadSeqAnchor(num_anchor)
 total_count = len(imgs)
+# without anchors the ground-truth flow is used, whose rectification is cached
+imgs_gt = data_loader.loadSeqRectifiedGT() if rectify_img and num_anchor == 0 else None
 
 # path to save results
 save_path = os.path.join(os.getcwd(), "test_results/seq2/")
@@ -60,8 +72,14 @@ for i in tqdm(range(total_count)):
     img_input = np.expand_dims(img_input_rgb[:, :, :, 0], -1)  # (1, h, w, 1)
     flow_gt = flows[i]
 
-    if num_anchor > 0:
-        flow = rectifier.getGS2RSFlow(depths[i], data_loader.cam, anchors[i])
+    if num_anchor > 0 and use_points:
+        flow = rectifier.getGS2RSFlowByPoints(
+            points[i], data_loader.cam, anchors[i])
+    elif num_anchor > 0:
+        if i % batch_size == 0:
+            flows_batch = rectifier.getGS2RSFlowBatch(
+                depths[i:i+batch_size], data_loader.cam, anchors[i:i+batch_size])
+        flow = flows_batch[i % batch_size]
     else:
         flow = flow_gt
 
@@ -73,7 +91,10 @@ for i in tqdm(range(total_count)):
 
     if rectify_img:
         img_rgb = 255*img_input_rgb[0]
-        img_rectified = rectifier.rectifyImgByFlow(img_rgb, flow)
+        if imgs_gt is not None:
+            img_rectified = imgs_gt[i]
+        else:
+            img_rectified = rectifier.rectifyImgByFlow(img_rgb, flow)
         cv2.imwrite(img_path+'{}.png'.format(i), img_rectified)
 
 print('Improved Ratio: {:.3f}'.format(wins/len(errs)))
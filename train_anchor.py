@@ -22,13 +22,27 @@ from keras.callbacks import ModelCheckpoint, TensorBoard
 
 from data_loader import dataLoader
 from model.anchornet import AnchorNet
+from model.layers import getVariantSuffix
 
 # read num_anchor from command line
 parser = argparse.ArgumentParser()
 parser.add_argument('--anchor', help='Number of anchors to predict')
+parser.add_argument(
+    '--base', help='Backbone: ResNet34, ResNet50, VGG16 or MobileNetV2', default='ResNet34')
+parser.add_argument(
+    '--width', help='Width multiplier of the channels', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether to use depthwise separable convolutions', default=0)
 args = parser.parse_args()
 num_anchor = int(args.anchor)
 print('Number of anchors to predict: {}'.format(num_anchor))
+base = args.base
+print('Backbone: {}'.format(base))
+width = float(args.width)
+print('Width: {}'.format(width))
+separable = True if int(args.separable) > 0 else False
+print('Separable: {}'.format(separable))
+suffix = getVariantSuffix(width, separable, base)
 
 # load data
 data_loader = dataLoader()
@@ -38,19 +52,20 @@ v_imgs = data_loader.loadValidationImg()
 v_anchors = data_loader.loadValidationAnchor(num_anchor)
 
 # load model
-anchornet = AnchorNet(data_loader.getImgShape(), num_anchor)
+anchornet = AnchorNet(data_loader.getImgShape(), num_anchor,
+                      base, width, separable)
 
 # checkpoint
 checkpoint_path = os.path.join(os.getcwd(), "checkpoints/")
 if not os.path.exists(checkpoint_path):
     os.makedirs(checkpoint_path)
 ckpt_name = os.path.join(
-    checkpoint_path, 'model_anchor{}.hdf5'.format(num_anchor))
+    checkpoint_path, 'model_anchor{}{}.hdf5'.format(num_anchor, suffix))
 checkpoint_cb = ModelCheckpoint(
     ckpt_name, save_weights_only=True, save_best_only=True)
 
 # tensorboard
-tensorboard_cb = TensorBoard(log_dir='./.logs/{}'.format(num_anchor))
+tensorboard_cb = TensorBoard(log_dir='./.logs/{}{}'.format(num_anchor, suffix))
 
 # parameters
 epochs = 200
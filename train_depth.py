@@ -15,12 +15,32 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import print_function, division
+import argparse
 import os
 from keras.optimizers import Adam
 from keras.callbacks import ModelCheckpoint, TensorBoard
 
 from data_loader import dataLoader
 from model.depthnet import DepthNet
+from model.layers import getVariantSuffix
+
+# read the model variant from command line
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    '--width', help='Width multiplier of the channels', default=1.0)
+parser.add_argument(
+    '--separable', help='Whether to use depthwise separable convolutions', default=0)
+parser.add_argument(
+    '--aux_weight', help='Loss weight of the pr2 and pr3 heads, to use them with --depth_level (saved as model_depth*_ms), 0 to only train pr1', default=0)
+args = parser.parse_args()
+width = float(args.width)
+print('Width: {}'.format(width))
+separable = True if int(args.separable) > 0 else False
+print('Separable: {}'.format(separable))
+aux_weight = float(args.aux_weight)
+print('Auxiliary loss weight: {}'.format(aux_weight))
+aux_levels = (2, 3) if aux_weight > 0 else ()
+suffix = getVariantSuffix(width, separable, multi_scale=aux_weight > 0)
 
 # load data
 data_loader = dataLoader()
@@ -30,18 +50,19 @@ v_imgs = data_loader.loadValidationImg(grayscale=True)
 v_depths = data_loader.loadValidationDepth()
 
 # load model
-depthnet = DepthNet(data_loader.getImgShape())
+depthnet = DepthNet(data_loader.getImgShape(), width=width,
+                    separable=separable, aux_levels=aux_levels)
 
 # checkpoint
 checkpoint_path = os.path.join(os.getcwd(), "checkpoints")
 if not os.path.exists(checkpoint_path):
     os.makedirs(checkpoint_path)
-ckpt_name = os.path.join(checkpoint_path, 'model_depth.hdf5')
+ckpt_name = os.path.join(checkpoint_path, 'model_depth{}.hdf5'.format(suffix))
 checkpoint = ModelCheckpoint(
     ckpt_name, save_weights_only=True, save_best_only=True)
 
 # tensorboard
-tensorboard_cb = TensorBoard(log_dir='./.logs/depth')
+tensorboard_cb = TensorBoard(log_dir='./.logs/depth'+suffix)
 
 # parameters
 epochs = 200
@@ -49,8 +70,10 @@ batch_size = 100
 lr = 1e-4
 decay = 9 / (epochs * imgs.shape[0] / batch_size)  # decay by 0.1 at the end
 
-# training
-depthnet.model.compile(optimizer=Adam(
-    lr=lr, decay=decay), loss=depthnet.depthLoss)
-depthnet.model.fit(imgs, depths, validation_data=(v_imgs, v_depths), batch_size=batch_size,
-                   epochs=epochs, callbacks=[checkpoint, tensorboard_cb])
+# training; with auxiliary heads every output is compared with the full
+# resolution depth, the losses of each are logged as val_y_pred{2,3}_loss
+num_outputs = 1+len(aux_levels)
+depthnet.model.compile(optimizer=Adam(lr=lr, decay=decay), loss=[depthnet.depthLoss]*num_outputs,
+                       loss_weights=[1.0]+[aux_weight]*len(aux_levels))
+depthnet.model.fit(imgs, [depths]*num_outputs, validation_data=(v_imgs, [v_depths]*num_outputs),
+                   batch_size=batch_size, epochs=epochs, callbacks=[checkpoint, tensorboard_cb])
@@ -17,77 +17,30 @@
 from __future__ import absolute_import, division, print_function
 import numpy as np
 import os
+import sys
 import cv2
 from tqdm import tqdm
-from numpy import linalg as LA
 
 from pwcnet import ModelPWCNet
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backends import getKernel
+
 pwc_net = ModelPWCNet()
 
 
-def getFlowBD(img0, img1, windowName=''):
+def getFlowBD(img0, img1, windowName='', backend=None):
     FLOW_THRES = 2               # threshold to accept a flow by bi-directional matching
-    h, w = img0.shape[:2]
 
     img_pairs = [(img0, img1), (img1, img0)]
     flow01, flow10 = pwc_net.predict_from_img_pairs(img_pairs, batch_size=2)
 
-    flow01_filtered = np.empty_like(flow01)
-    flow01_filtered[:] = np.nan
-    for v0 in range(h):
-        for u0 in range(w):
-            fu01, fv01 = flow01[v0, u0, :]
-            u1, v1 = u0+fu01, v0+fv01
-            u1i, v1i = int(u1+0.5), int(v1+0.5)
-            if 0 <= v1i < h and 0 <= u1i < w:
-                fu10, fv10 = flow10[v1i, u1i, :]
-                du, dv = u1+fu10-u0, v1+fv10-v0
-                if (du*du+dv*dv) < FLOW_THRES:  # bi-directional filtering
-                    flow01_filtered[v0, u0, 0] = flow01[v0, u0, 0]
-                    flow01_filtered[v0, u0, 1] = flow01[v0, u0, 1]
-    return flow01_filtered
-
-
-def getRay(cam, uv):
-    ray_uv = np.ones(3, dtype=np.float32)
-    ray_uv[0] = (uv[0]-cam[2]) / cam[0]
-    ray_uv[1] = (uv[1]-cam[3]) / cam[1]
-    return np.expand_dims(ray_uv / LA.norm(ray_uv), -1)
-
-
-def depthFromTriangulation(cam_ref, cam_cur, T_cur_ref, uv_ref, uv_cur):
-    R_cur_ref = T_cur_ref[0:3, 0:3]
-    t_cur_ref = T_cur_ref[0:3, 3]
-    ray_uv_ref = getRay(cam_ref, uv_ref)
-    ray_uv_cur = getRay(cam_cur, uv_cur)
-
-    A = np.hstack((np.matmul(R_cur_ref, ray_uv_ref), ray_uv_cur))
-    AtA = np.matmul(A.T, A)
-    if LA.det(AtA) < 1e-5:
-        return -1
-    depth2 = - np.matmul(np.matmul(LA.inv(AtA), A.T), t_cur_ref)
-    depth = np.fabs(depth2[0])
-
-    return depth*ray_uv_ref[-1]
-
-
-def calculateCurDepth(cam0, img0, cam1, img1, T_cam0_v1, v1_lut):
-    h, w = img0.shape[:2]
-
-    depth1 = np.empty([h, w])
-    depth1[:] = np.nan
-
-    flow10 = getFlowBD(img1, img0, 'Match')
-    for v1 in range(h):
-        for u1 in range(w):
-            fu, fv = flow10[v1, u1, :]
-            if not np.isnan(fu):
-                uv0 = [u1+fu, v1+fv]
-                depth1[v1, u1] = depthFromTriangulation(
-                    cam1, cam0, T_cam0_v1[v1_lut[v1, u1]], [u1, v1], uv0)
-
-    return depth1
+    return getKernel('flow_bd', backend)(flow01, flow10, FLOW_THRES)
+
+
+def calculateCurDepth(cam0, img0, cam1, img1, T_cam0_v1, v1_lut, backend=None):
+    flow10 = getFlowBD(img1, img0, 'Match', backend)
+    return getKernel('triangulate', backend)(flow10, cam0, cam1, T_cam0_v1, v1_lut)
 
 
 def getDepth(save_path):
@@ -0,0 +1,259 @@
+# Learning Rolling Shutter Correction from Real Data without Camera Motion Assumption
+# Copyright (C) <2020> <Jiawei Mo, Md Jahidul Islam, Junaed Sattar>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import division, absolute_import
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+from rectifier import rectifier
+
+from model.depthnet import DepthNet
+from model.anchornet import AnchorNet
+from model.layers import getVariantSuffix
+
+STAGES = ['input', 'anchornet', 'depthnet', 'maps', 'warp']
+
+
+class depthTracker():
+    # DepthNet on keyframes only: in between, the depth of the previous frame
+    # is warped into the current one by the frame to frame motion
+    # extrapolated from the previous anchors; a keyframe is forced every
+    # key_interval frames or when the image (at 1/4 resolution) differs from
+    # the keyframe by more than key_thres on average; frames must come in
+    # sequence order
+    def __init__(self, cam, key_interval=5, key_thres=0.05, frame_ratio=1.0):
+        self.cam = cam
+        self.key_interval = key_interval
+        self.key_thres = key_thres
+        self.frame_ratio = frame_ratio
+        self.key_count = [0, 0]  # keyframes, all frames
+        self.reset()
+
+    def reset(self):
+        # e.g. at a cut, the next frame is a keyframe
+        self.key_img = None
+        self.since_key = 0
+        self.depth, self.anchors = None, None
+
+    def getKeyframeRate(self):
+        return self.key_count[0] / max(self.key_count[1], 1)
+
+    def selectKeyframes(self, imgs):
+        # (b, h, w, c) network inputs in [0, 1] to keyframe flags
+        key = np.zeros(len(imgs), dtype=bool)
+        for j, img in enumerate(imgs):
+            img_small = cv2.resize(np.ascontiguousarray(img[:, :, 0]), None, fx=0.25,
+                                   fy=0.25, interpolation=cv2.INTER_AREA)
+            if self.key_img is None or self.since_key+1 >= self.key_interval or \
+                    np.mean(np.abs(img_small-self.key_img)) > self.key_thres:
+                key[j] = True
+                self.key_img = img_small
+                self.since_key = 0
+            else:
+                self.since_key += 1
+        self.key_count[0] += np.count_nonzero(key)
+        self.key_count[1] += len(imgs)
+        return key
+
+    def fillDepths(self, depths, key, anchors):
+        # depths of the keyframes are predicted, the others are filled here
+        for j in range(len(depths)):
+            if not key[j]:
+                R, t = rectifier.getFramePose(self.anchors, self.frame_ratio)
+                depths[j] = rectifier.warpDepth(self.depth, self.cam, R, t)
+            self.depth, self.anchors = depths[j], anchors[j]
+        return depths
+
+
+class Unroller():
+    # trained DepthNet and AnchorNet behind a frame in, frame out API; frames
+    # are uint8 bgr images at the network resolution im_shape or any other
+    # one (e.g. native), cam belongs to im_shape
+    def __init__(self, im_shape, cam, num_anchor, ckpt_path=None, max_batch=8,
+                 rot_thres=-1, fixed_point=False, motion_thres=-1, min_depth=1.0,
+                 key_interval=0, key_thres=0.05, frame_ratio=1.0, depth_level=1,
+                 width=1.0, separable=False, base='ResNet34'):
+        if ckpt_path is None:
+            ckpt_path = os.path.join(os.getcwd(), 'checkpoints')
+        self.im_shape = (im_shape[0], im_shape[1])
+        self.cam = cam
+        self.num_anchor = num_anchor
+        self.max_batch = max_batch
+        self.rot_thres = rot_thres
+        self.fixed_point = fixed_point
+        # frames whose estimated displacement is below motion_thres (px)
+        # pass through unchanged
+        self.motion_thres = motion_thres
+        self.min_depth = min_depth
+        # key_interval > 0: frames of one sequence in order, DepthNet on
+        # keyframes only
+        self.tracker = None
+        if key_interval > 0:
+            self.tracker = depthTracker(
+                cam, key_interval, key_thres, frame_ratio)
+
+        # depth_level > 1: coarser depth from a truncated DepthNet decoder,
+        # whose heads are trained in the multi-scale checkpoint; width,
+        # separable and base select a lighter trained model variant
+        self.depthnet = DepthNet(self.im_shape, depth_level, width, separable)
+        self.depthnet.loadWeights(os.path.join(ckpt_path, 'model_depth{}.hdf5'.format(
+            getVariantSuffix(width, separable, multi_scale=depth_level > 1))))
+        self.anchornet = AnchorNet(
+            self.im_shape, num_anchor, base, width, separable)
+        self.anchornet.model.load_weights(os.path.join(ckpt_path, 'model_anchor{}{}.hdf5'.format(
+            num_anchor, getVariantSuffix(width, separable, base))))
+
+        # network input reused by every call
+        self.inputs = np.zeros(
+            [max_batch, self.im_shape[0], self.im_shape[1], 3], dtype=np.float32)
+        self.latency_lock = threading.Lock()
+        self.resetLatency()
+        # warm up, e.g. graph construction and memory allocation of TF
+        self.anchornet.model.predict(self.inputs, batch_size=max_batch)
+        self.depthnet.model.predict(
+            self.inputs[:, :, :, 0:1], batch_size=max_batch)
+
+    def resetLatency(self):
+        # per stage: total seconds and frames
+        self.latency = {stage: [0.0, 0] for stage in STAGES}
+        self.skip_count = [0, 0]  # skipped, all frames
+
+    def getSkipRate(self):
+        return self.skip_count[0] / max(self.skip_count[1], 1)
+
+    def getLatency(self):
+        # mean ms per frame of every stage so far
+        return {stage: 1000*t/n if n > 0 else 0.0
+                for stage, (t, n) in self.latency.items()}
+
+    def toc(self, stage, num_frames, start):
+        # adds the time since start to stage, returns now; the stages may run
+        # on different threads
+        now = time.time()
+        with self.latency_lock:
+            self.latency[stage][0] += now - start
+            self.latency[stage][1] += num_frames
+        return now
+
+    def predict(self, frames, cams=None):
+        # anchors (b, 6N), depths (b, h, w, 1), rotation only and skip flags
+        # of up to max_batch frames; depth is only predicted for the frames
+        # which are neither
+        num_frames = len(frames)
+        h, w = self.im_shape
+        start = time.time()
+        for j, frame in enumerate(frames):
+            if frame.shape[:2] != self.im_shape:
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            np.divide(frame, 255, out=self.inputs[j], casting='unsafe')
+        inputs = self.inputs[:num_frames]
+        start = self.toc('input', num_frames, start)
+
+        anchors = self.anchornet.model.predict(inputs, batch_size=num_frames)
+        skip = np.zeros(num_frames, dtype=bool)
+        if self.motion_thres >= 0:
+            for j, anchor in enumerate(anchors):
+                cam = self.cam if cams is None else cams[j]
+                skip[j] = rectifier.getMaxDisplacement(
+                    cam, anchor, self.im_shape, self.min_depth) < self.motion_thres
+        rot_only = np.array([rectifier.isRotationOnly(
+            anchor, self.rot_thres) for anchor in anchors]) & ~skip
+        with self.latency_lock:
+            self.skip_count[0] += np.count_nonzero(skip)
+            self.skip_count[1] += num_frames
+        start = self.toc('anchornet', num_frames, start)
+
+        depths = np.empty([num_frames, h, w, 1], dtype=np.float32)
+        if self.tracker is not None:
+            key = self.tracker.selectKeyframes(inputs)
+            depth_idx = np.flatnonzero(key)
+        else:
+            depth_idx = np.flatnonzero(~rot_only & ~skip)
+        if depth_idx.shape[0] > 0:
+            depths[depth_idx] = self.depthnet.model.predict(
+                inputs[depth_idx, :, :, 0:1], batch_size=num_frames)
+        if self.tracker is not None:
+            self.tracker.fillDepths(depths, key, anchors)
+        self.toc('depthnet', num_frames, start)
+        return anchors, depths, rot_only, skip
+
+    def getMaps(self, anchors, depth, rot_only, shape, cam):
+        if rot_only:
+            maps = rectifier.getMapsByRotation(cam, anchors, self.im_shape)
+        else:
+            maps = rectifier.getMapsByDepth(depth, cam, anchors)
+        if shape[:2] != self.im_shape:
+            return rectifier.upsampleMaps(maps, shape, self.fixed_point)
+        if self.fixed_point:
+            return rectifier.toFixedPoint(maps)
+        return maps
+
+    def rectifyPredicted(self, frames, anchors, depths, rot_only, skip, cams=None):
+        # rectified frames from the predictions of predict(frames), which
+        # may run on another thread than predict; cams of the frames at the
+        # network resolution if they come from different cameras
+        start = time.time()
+        maps = []
+        for j, frame in enumerate(frames):
+            cam = self.cam if cams is None else cams[j]
+            maps.append(None if skip[j] else self.getMaps(
+                anchors[j], depths[j], rot_only[j], frame.shape, cam))
+        start = self.toc('maps', len(frames), start)
+        frames_rectified = []
+        for j, frame in enumerate(frames):
+            frames_rectified.append(frame if skip[j] else
+                                    rectifier.rectifyImgByMaps(frame, maps[j]))
+        self.toc('warp', len(frames), start)
+        return frames_rectified
+
+    def rectifyBatch(self, frames):
+        # list of rectified frames, each at the resolution of its input
+        frames_rectified = []
+        for start in range(0, len(frames), self.max_batch):
+            chunk = frames[start:start+self.max_batch]
+            frames_rectified.extend(
+                self.rectifyPredicted(chunk, *self.predict(chunk)))
+        return frames_rectified
+
+    def rectify(self, frame):
+        return self.rectifyBatch([frame])[0]
+
+    def predictFlowBatch(self, frames):
+        # (b, h, w, 2) gs-to-rs flows at the network resolution, as test.py
+        # evaluates them
+        flows = []
+        for start in range(0, len(frames), self.max_batch):
+            chunk = frames[start:start+self.max_batch]
+            anchors, depths, rot_only, skip = self.predict(chunk)
+            start_maps = time.time()
+            flows_chunk = np.zeros(
+                [len(chunk), self.im_shape[0], self.im_shape[1], 2], dtype=np.float32)
+            for j in np.flatnonzero(rot_only):
+                flows_chunk[j] = rectifier.getFlowByMaps(rectifier.getMapsByRotation(
+                    self.cam, anchors[j], self.im_shape))
+            depth_idx = np.flatnonzero(~rot_only & ~skip)
+            if depth_idx.shape[0] > 0:
+                flows_chunk[depth_idx] = rectifier.getGS2RSFlowBatch(
+                    depths[depth_idx], self.cam, anchors[depth_idx])
+            self.toc('maps', len(chunk), start_maps)
+            flows.append(flows_chunk)
+        return np.concatenate(flows)
+
+    def predictFlow(self, frame):
+        return self.predictFlowBatch([frame])[0]